@@ -0,0 +1,81 @@
+import random
+from socket import inet_aton
+from socket import inet_ntoa
+from timeit import timeit
+
+from aiobtdht import utils
+
+
+# region Codec of aio-btdht 0.0.9
+def legacy_decode_id(id_):
+    if len(id_) != 20:
+        raise ValueError("Wrong length")
+
+    return int.from_bytes(id_, "big")
+
+
+def legacy_decode_samples(samples):
+    return [legacy_decode_id(samples[i:i+20]) for i in range(0, len(samples), 20)]
+
+
+def legacy_encode_addr(addr):
+    host, port = addr
+    return b"".join((inet_aton(host), port.to_bytes(2, "big")))
+
+
+def legacy_decode_addr(addr):
+    host, port = addr[:4], addr[4:6]
+    return (inet_ntoa(host), int.from_bytes(port, "big"))
+
+
+def legacy_encode_nodes(nodes):
+    return b"".join(b"".join((id_.to_bytes(20, "big"), legacy_encode_addr(addr))) for id_, addr in nodes)
+
+
+def legacy_decode_nodes(nodes):
+    if len(nodes) % 26 != 0:
+        raise ValueError("Wrong length")
+
+    return [
+        (legacy_decode_id(nodes[i: i + 20]), legacy_decode_addr(nodes[i + 20: i + 26]))
+        for i in range(0, len(nodes), 26)
+    ]
+
+
+def legacy_decode_peers(peers):
+    return [legacy_decode_addr(peer) for peer in peers]
+
+
+# endregion
+
+
+def main():
+    rnd = random.Random(0)
+
+    def random_addr():
+        return inet_ntoa(rnd.getrandbits(32).to_bytes(4, "big")), rnd.randrange(65536)
+
+    nodes = [(rnd.getrandbits(160), random_addr()) for _ in range(8)]
+    encoded_nodes = utils.encode_nodes(nodes)
+    peers = utils.encode_peers(random_addr() for _ in range(50))
+    samples = bytes(rnd.getrandbits(8) for _ in range(20 * 20))
+
+    cases = (
+        ("decode_nodes", legacy_decode_nodes, utils.decode_nodes, encoded_nodes, len(nodes)),
+        ("encode_nodes", legacy_encode_nodes, utils.encode_nodes, nodes, len(nodes)),
+        ("decode_peers", legacy_decode_peers, utils.decode_peers, peers, len(peers)),
+        ("decode_samples", legacy_decode_samples, utils.decode_samples, samples, len(samples) // 20)
+    )
+
+    print(f"{'function':>16} {'legacy, entries/s':>18} {'current, entries/s':>19} {'speedup':>8}")
+    for name, legacy, current, arg, entries in cases:
+        if legacy(arg) != current(arg):
+            raise AssertionError(f"{name} result differs from legacy implementation")
+
+        number = 200000 // entries
+        rates = [entries * number / timeit(lambda: f(arg), number=number) for f in (legacy, current)]
+        print(f"{name:>16} {rates[0]:>18,.0f} {rates[1]:>19,.0f} {rates[1] / rates[0]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
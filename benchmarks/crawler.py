@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import random
+from time import monotonic
+
+from aiobtdht.crawler import Crawler
+from aiobtdht.routing_table import RoutingTable
+from aiobtdht.utils import call_timeout
+
+
+class Swarm:
+    # Simulated swarm of BEP 51 nodes, every node stores a random part of a common info_hash pool.
+    # Stands in for `DHT` in `Crawler`: provides `routing_table` and `remote_sample_infohashes`.
+    def __init__(self, size, pool_size, rnd, dead_ratio, latency, timeout):
+        self.timeout = timeout
+        self.rnd = rnd
+
+        pool = [rnd.getrandbits(160) for _ in range(pool_size)]
+        self.nodes = [
+            (rnd.getrandbits(160), (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 6881)) for i in range(size)
+        ]
+        self.ids = {addr: id_ for id_, addr in self.nodes}
+        self.latency = {addr: rnd.uniform(*latency) for _, addr in self.nodes}
+        self.dead = {addr for _, addr in rnd.sample(self.nodes, int(size * dead_ratio))}
+        self.stored = {addr: rnd.sample(pool, rnd.randrange(0, 200)) for _, addr in self.nodes}
+        self.tables = {}
+
+        self.routing_table = RoutingTable(0)
+        for id_, addr in rnd.sample(self.nodes, 64):
+            self.routing_table.add(id_, addr)
+
+    def _table(self, addr):
+        table = self.tables.get(addr)
+        if table is None:
+            table = self.tables[addr] = RoutingTable(self.ids[addr])
+            for id_, node_addr in self.rnd.sample(self.nodes, 64):
+                table.add(id_, node_addr)
+
+        return table
+
+    async def _sample_infohashes(self, addr, target_id):
+        if addr in self.dead:
+            await asyncio.sleep(3600)
+
+        await asyncio.sleep(self.latency[addr])
+        stored = self.stored[addr]
+        return addr, {
+            "id": self.ids[addr],
+            "interval": 21600,
+            "num": len(stored),
+            "nodes": self._table(addr)[target_id],
+            "samples": self.rnd.sample(stored, min(20, len(stored)))
+        }
+
+    async def remote_sample_infohashes(self, addr, target_id, timeout=3):
+        return await call_timeout(self._sample_infohashes(addr, target_id), self.timeout, None)
+
+
+async def main(args):
+    swarm = Swarm(args.nodes, args.pool, random.Random(args.seed), args.dead, (args.min_latency, args.max_latency),
+                  args.timeout)
+    crawler = Crawler(swarm, rate=args.rate, concurrency=args.concurrency)
+
+    started = monotonic()
+    async for _ in crawler.crawl():
+        if monotonic() - started >= args.duration:
+            break
+
+    elapsed = monotonic() - started
+    print(f"rpc/s: {crawler.rpc_count / elapsed:,.0f}, responses/s: {crawler.responses / elapsed:,.0f}, "
+          f"samples/s: {crawler.samples / elapsed:,.0f}, unique info_hashes/s: {crawler.unique / elapsed:,.0f}, "
+          f"unique total: {crawler.unique:,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BEP 51 crawler throughput on a simulated swarm")
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--pool", type=int, default=500000, help="number of distinct info_hashes in the swarm")
+    parser.add_argument("--dead", type=float, default=0.2, help="ratio of nodes which never answer")
+    parser.add_argument("--min-latency", type=float, default=0.02)
+    parser.add_argument("--max-latency", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=1000, help="requests per second")
+    parser.add_argument("--concurrency", type=int, default=128)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import random
+from statistics import mean
+from statistics import median
+from time import monotonic
+
+from aiobtdht.lookup import Lookup
+from aiobtdht.routing_table import RoutingTable
+from aiobtdht.utils import call_timeout
+
+
+class Network:
+    # Simulated DHT: every node knows a random part of the network and its neighbours in id space,
+    # answers `get_peers` after its own latency, dead nodes never answer
+    def __init__(self, size, rnd, dead_ratio, latency, timeout):
+        self.timeout = timeout
+        self.rpc_count = 0
+
+        ids = sorted(rnd.getrandbits(160) for _ in range(size))
+        self.nodes = [(id_, (f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}", 6881)) for i, id_ in enumerate(ids)]
+        self.latency = {addr: rnd.uniform(*latency) for _, addr in self.nodes}
+        self.dead = {addr for _, addr in rnd.sample(self.nodes, int(size * dead_ratio))}
+        self.peers = {}
+
+        self.tables = {}
+        for i, (id_, addr) in enumerate(self.nodes):
+            table = RoutingTable(id_)
+            for node_id, node_addr in rnd.sample(self.nodes, 64) + self.nodes[max(i - 8, 0):i + 8]:
+                if node_addr != addr:
+                    table.add(node_id, node_addr)
+
+            self.tables[addr] = table
+
+    def announce(self, info_hash, peer):
+        alive = ((id_, addr) for id_, addr in self.nodes if addr not in self.dead)
+        for _, addr in RoutingTable.get_k_closest(info_hash, alive, key=lambda it: it[0]):
+            self.peers.setdefault((addr, info_hash), set()).add(peer)
+
+    async def _get_peers(self, addr, info_hash):
+        self.rpc_count += 1
+
+        if addr in self.dead:
+            await asyncio.sleep(3600)
+
+        await asyncio.sleep(self.latency[addr])
+        return addr, {
+            "id": self.tables[addr]._local_id,
+            "nodes": self.tables[addr][info_hash],
+            "values": list(self.peers.get((addr, info_hash), ()))
+        }
+
+    async def get_peers(self, addr, info_hash):
+        return await call_timeout(self._get_peers(addr, info_hash), self.timeout, None)
+
+
+async def legacy_lookup(network, seeds, info_hash):
+    # Lock-step lookup of aio-btdht 0.0.9 (`DHT._get_values`)
+    result = set()
+    known = set()
+    peers = map(lambda it: it[1], seeds)
+
+    while True:
+        responses = filter(None, await asyncio.gather(*(network.get_peers(peer, info_hash) for peer in peers)))
+
+        candidates = set()
+        for addr, data in responses:
+            candidates.update(data.get("nodes", []))
+            result.update(data.get("values", []))
+
+        closest = RoutingTable.get_k_closest(info_hash, candidates - known, key=lambda it: it[0])
+
+        if closest:
+            known.update(candidates)
+            peers = map(lambda it: it[1], closest)
+        else:
+            return result
+
+
+async def engine_lookup(network, seeds, info_hash, alpha):
+    result = set()
+    lookup = Lookup(info_hash, lambda peer: network.get_peers(peer, info_hash), alpha=alpha)
+
+    async for _, data in lookup.responses(seeds):
+        result.update(data.get("values", []))
+
+    return result
+
+
+async def measure(network, lookup, targets):
+    async def run(client, info_hash):
+        started = monotonic()
+        peers = await lookup(network.tables[client][info_hash], info_hash)
+        return monotonic() - started, bool(peers)
+
+    network.rpc_count = 0
+    results = await asyncio.gather(*(run(client, info_hash) for client, info_hash in targets))
+    latencies = sorted(latency for latency, _ in results)
+
+    return {
+        "p50": median(latencies),
+        "p90": latencies[int(len(latencies) * 0.9)],
+        "max": latencies[-1],
+        "rpc": network.rpc_count / len(targets),
+        "hit": mean(hit for _, hit in results)
+    }
+
+
+async def main(args):
+    rnd = random.Random(args.seed)
+    network = Network(args.nodes, rnd, args.dead, (args.min_latency, args.max_latency), args.timeout)
+
+    alive = [addr for _, addr in network.nodes if addr not in network.dead]
+    targets = []
+    for _ in range(args.lookups):
+        info_hash = rnd.getrandbits(160)
+        network.announce(info_hash, ("192.168.0.1", 6881))
+        targets.append((rnd.choice(alive), info_hash))
+
+    print(f"{'lookup':>12} {'p50, s':>8} {'p90, s':>8} {'max, s':>8} {'rpc/lookup':>11} {'hit rate':>9}")
+    for name, lookup in (
+            ("legacy", lambda seeds, info_hash: legacy_lookup(network, seeds, info_hash)),
+            *((f"alpha={alpha}", lambda seeds, info_hash, alpha=alpha: engine_lookup(network, seeds, info_hash, alpha))
+              for alpha in args.alpha)):
+        r = await measure(network, lookup, targets)
+        print(f"{name:>12} {r['p50']:>8.3f} {r['p90']:>8.3f} {r['max']:>8.3f} {r['rpc']:>11.1f} {r['hit']:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lock-step vs concurrent lookup on a simulated network")
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--lookups", type=int, default=50)
+    parser.add_argument("--dead", type=float, default=0.2, help="ratio of nodes which never answer")
+    parser.add_argument("--min-latency", type=float, default=0.02)
+    parser.add_argument("--max-latency", type=float, default=0.2)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--alpha", type=int, nargs="+", default=[3, 8])
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
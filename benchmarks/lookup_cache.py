@@ -0,0 +1,69 @@
+import argparse
+import asyncio
+import random
+from time import monotonic
+
+from aiobtdht import DHT
+from aiobtdht.lookup import LookupCache
+from aiobtdht.simulator import Endpoint
+from aiobtdht.simulator import Network
+
+
+async def run(args, cache_ttl):
+    # Repeated `__getitem__` and `announce` of a few popular info_hashes by one node of a simulated network
+    loop = asyncio.get_event_loop()
+    rnd = random.Random(args.seed)
+    network = Network(latency=(args.min_latency, args.max_latency), seed=args.seed)
+
+    nodes = []
+    for i in range(args.nodes):
+        endpoint = Endpoint(network)
+        endpoint.run(*network.addr(i), loop=loop)
+        nodes.append(DHT(rnd.getrandbits(160), endpoint, loop, lookup_cache=LookupCache(ttl=cache_ttl)))
+        nodes[-1].start()
+
+    router = [network.addr(0)]
+    for node in nodes[1:]:
+        await node.bootstrap(router)
+
+    info_hashes = [rnd.getrandbits(160).to_bytes(20, "big") for _ in range(args.info_hashes)]
+    for info_hash in info_hashes:
+        await rnd.choice(nodes[1:]).announce(info_hash)
+
+    client = nodes[0]
+    sent = network.sent
+    started = monotonic()
+
+    for _ in range(args.rounds):
+        # Burst of identical requests, then an announce of every info_hash
+        await asyncio.gather(*(client[info_hash] for info_hash in info_hashes for _ in range(args.burst)))
+        await asyncio.gather(*(client.announce(info_hash) for info_hash in info_hashes))
+
+    requests = args.rounds * len(info_hashes) * (args.burst + 1)
+    cache = client.lookup_cache
+    print(f"cache ttl {cache_ttl:>3} s: {(monotonic() - started) / requests * 1000:.1f} ms/request, "
+          f"{(network.sent - sent) / requests:.1f} datagrams/request, "
+          f"hits: {cache.hits}, misses: {cache.misses}, merged: {cache.merged}")
+
+    for node in nodes:
+        await node.close()
+
+
+async def main(args):
+    for cache_ttl in (0, args.ttl):
+        await run(args, cache_ttl)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="repeated lookups of popular info_hashes with and without lookup cache"
+    )
+    parser.add_argument("--nodes", type=int, default=300)
+    parser.add_argument("--info-hashes", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=10, help="concurrent identical requests")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--ttl", type=float, default=60, help="cache ttl in seconds")
+    parser.add_argument("--min-latency", type=float, default=0.005)
+    parser.add_argument("--max-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
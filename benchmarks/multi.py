@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import random
+import tracemalloc
+
+from aiobtdht import DHT
+from aiobtdht.multi import MultiDHT
+from aiobtdht.simulator import Endpoint
+from aiobtdht.simulator import Network
+
+
+def overhead(loop, network, rnd, count, multi):
+    # Memory and asyncio tasks taken by `count` ids served by separate DHTs or by one MultiDHT
+    tasks = len(asyncio.all_tasks(loop))
+    tracemalloc.start()
+
+    if multi:
+        endpoint = Endpoint(network)
+        endpoint.run("192.168.0.1", 6881, loop=loop)
+        instances = [MultiDHT([rnd.getrandbits(160) for _ in range(count)], endpoint, loop)]
+    else:
+        instances = []
+        for i in range(count):
+            endpoint = Endpoint(network)
+            endpoint.run("192.168.0.1", 10000 + i, loop=loop)
+            instances.append(DHT(rnd.getrandbits(160), endpoint, loop))
+
+    for instance in instances:
+        instance.start()
+
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return instances, memory, len(asyncio.all_tasks(loop)) - tasks
+
+
+async def main(args):
+    loop = asyncio.get_event_loop()
+    rnd = random.Random(args.seed)
+    network = Network(latency=(args.min_latency, args.max_latency), seed=args.seed)
+
+    nodes = []
+    for i in range(args.nodes):
+        endpoint = Endpoint(network)
+        endpoint.run(*network.addr(i), loop=loop)
+        nodes.append(DHT(rnd.getrandbits(160), endpoint, loop))
+        nodes[-1].start()
+
+    router = [network.addr(0)]
+    for node in nodes[1:]:
+        await node.bootstrap(router)
+
+    for multi in (False, True):
+        instances, memory, tasks = overhead(loop, network, rnd, args.ids, multi)
+        await asyncio.gather(*(instance.bootstrap(router) for instance in instances))
+        await asyncio.sleep(args.settle)
+
+        ids = set().union(*(instance.local_ids for instance in instances))
+        known = sum(id_ in node.routing_table for node in nodes for id_ in ids)
+        print(f"{'MultiDHT' if multi else 'DHT':<8} ids: {len(ids)}, memory: {memory / len(ids) / 1024:.1f} KiB/id, "
+              f"tasks: {tasks / len(ids):.2f}/id, routing table entries of the ids on other nodes: {known}")
+
+        for instance in instances:
+            await instance.close()
+
+    for node in nodes:
+        await node.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="per-id overhead of separate DHTs compared with one MultiDHT")
+    parser.add_argument("--nodes", type=int, default=300)
+    parser.add_argument("--ids", type=int, default=32)
+    parser.add_argument("--min-latency", type=float, default=0.005)
+    parser.add_argument("--max-latency", type=float, default=0.05)
+    parser.add_argument("--settle", type=float, default=3, help="delay after bootstrap in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,43 @@
+import argparse
+import gc
+import random
+import tracemalloc
+from socket import inet_ntoa
+
+from aiobtdht.routing_table import RoutingTable
+
+
+def measure(count, compact):
+    rnd = random.Random(count)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    table = RoutingTable(0, compact=compact)
+    for _ in range(count):
+        table.add(rnd.getrandbits(160), (inet_ntoa(rnd.getrandbits(32).to_bytes(4, "big")), rnd.randrange(1, 65536)))
+
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    nodes = sum(len(bucket) for bucket in table._buckets)
+    return nodes, len(table._buckets), size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing table memory usage per node")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} {'nodes':>10} {'buckets':>10} {'total, MiB':>12} {'bytes/node':>12}")
+    for count in args.sizes:
+        for compact in (False, True):
+            nodes, buckets, size = measure(count, compact)
+            print(f"{'compact' if compact else 'default':>8} {nodes:>10} {buckets:>10} "
+                  f"{size / 2 ** 20:>12.1f} {size / nodes:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import random
+from timeit import timeit
+
+from cerberus import Validator
+
+from aiobtdht import schemas
+from aiobtdht.utils import encode_nodes
+from aiobtdht.utils import encode_peers
+
+
+def messages(rnd):
+    def id_():
+        return rnd.getrandbits(160)
+
+    def raw_id():
+        return id_().to_bytes(20, "big")
+
+    nodes = [(id_(), ("10.0.0.%d" % i, 6881)) for i in range(8)]
+    peers = [("10.0.1.%d" % i, 6881) for i in range(50)]
+
+    return (
+        ("PING_ARGS", {"id": raw_id()}),
+        ("PING_RESULT", {"id": id_()}),
+        ("FIND_NODE_ARGS", {"id": raw_id(), "target": raw_id()}),
+        ("FIND_NODE_RESULT", {"id": id_(), "nodes": nodes}),
+        ("FIND_NODE_RESULT_REMOTE", {"id": raw_id(), "nodes": encode_nodes(nodes)}),
+        ("GET_PEERS_ARGS", {"id": raw_id(), "info_hash": raw_id()}),
+        ("GET_PEERS_RESULT", {"id": id_(), "token": b"token", "values": peers}),
+        ("GET_PEERS_RESULT_REMOTE", {"id": raw_id(), "token": b"token", "values": encode_peers(peers)}),
+        ("ANNOUNCE_PEER_ARGS", {"id": raw_id(), "info_hash": raw_id(), "token": b"token", "implied_port": 1}),
+        ("ANNOUNCE_PEER_ARGS_REMOTE", {"id": id_(), "info_hash": id_(), "token": b"token", "implied_port": 0}),
+        ("SAMPLE_INFOHASHES_RESULT_REMOTE", {
+            "id": raw_id(), "interval": 21600, "num": 100, "nodes": encode_nodes(nodes),
+            "samples": b"".join(raw_id() for _ in range(20))
+        })
+    )
+
+
+def main():
+    validator = Validator()
+    validator.allow_unknown = True
+
+    def cerberus_validate(document, schema):
+        validator.validate(document, schema)
+
+    def compiled_validate(document, schema):
+        schema.validate(document)
+
+    print(f"{'schema':>32} {'cerberus, msg/s':>16} {'compiled, msg/s':>16} {'speedup':>8}")
+    for name, document in messages(random.Random(0)):
+        schema = getattr(schemas, name)
+
+        if not validator.validate(document, dict(schema)) or validator.document != schema.validate(document)[0]:
+            raise AssertionError(f"{name} result differs from Cerberus")
+
+        number = 2000
+        rates = [
+            number / timeit(lambda: f(document, s), number=number)
+            for f, s in ((cerberus_validate, dict(schema)), (compiled_validate, schema))
+        ]
+        print(f"{name:>32} {rates[0]:>16,.0f} {rates[1]:>16,.0f} {rates[1] / rates[0]:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import argparse
+import asyncio
+import random
+from statistics import mean
+from time import monotonic
+from time import process_time
+
+from aiobtdht import DHT
+from aiobtdht.simulator import Endpoint
+from aiobtdht.simulator import Network
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def count_calls(counters, node, method):
+    # Replace `node.<method>` with a wrapper counting calls into `counters[node]`
+    f = getattr(node, method)
+
+    async def wrapper(*args, **kwargs):
+        counters[node] = counters.get(node, 0) + 1
+        return await f(*args, **kwargs)
+
+    setattr(node, method, wrapper)
+
+
+async def measure(name, nodes, jobs, concurrency, is_hit, methods):
+    # Run `jobs(node)` for every node with at most `concurrency` of them at once
+    counters = {}
+    for node in nodes:
+        for method in methods:
+            count_calls(counters, node, method)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    hits = 0
+
+    async def run(node):
+        nonlocal hits
+        async with semaphore:
+            started = monotonic()
+            result = await jobs(node)
+            latencies.append(monotonic() - started)
+            hits += bool(is_hit(node, result))
+
+    cpu_started = process_time()
+    await asyncio.gather(*(run(node) for node in nodes))
+    cpu = process_time() - cpu_started
+
+    p50, p90, p99 = (percentile(latencies, p) for p in (0.5, 0.9, 0.99))
+    print(f"{name:<10} lookups: {len(nodes):>5}, latency p50/p90/p99: {p50:.3f}/{p90:.3f}/{p99:.3f} s, "
+          f"RPCs/lookup: {mean(counters.get(node, 0) for node in nodes):.1f}, hit rate: {hits / len(nodes):.1%}, "
+          f"CPU/lookup: {cpu / len(nodes) * 1000:.2f} ms")
+
+    for node in nodes:
+        for method in methods:
+            delattr(node, method)
+
+
+async def main(args):
+    loop = asyncio.get_event_loop()
+    rnd = random.Random(args.seed)
+    network = Network(latency=(args.min_latency, args.max_latency), loss=args.loss, seed=args.seed)
+
+    nodes = []
+    for i in range(args.nodes):
+        endpoint = Endpoint(network)
+        endpoint.run(*network.addr(i), loop=loop)
+        nodes.append(DHT(rnd.getrandbits(160), endpoint, loop, lookup_timeout=args.timeout))
+        nodes[-1].start()
+
+    router = [network.addr(0)]
+    await measure(
+        "bootstrap", nodes[1:], lambda node: node.bootstrap(router), args.concurrency,
+        lambda node, _: len(node.routing_table) >= 8, ("remote_find_node",)
+    )
+
+    # Let admission verify contacts of inbound queries
+    await asyncio.sleep(args.settle)
+
+    torrents = {rnd.getrandbits(160).to_bytes(20, "big"): node for node in rnd.sample(nodes, args.lookups)}
+    announced = {node: info_hash for info_hash, node in torrents.items()}
+    await measure(
+        "announce", list(announced), lambda node: node.announce(announced[node]), args.concurrency,
+        lambda node, _: any(int.from_bytes(announced[node], "big") in other.torrents for other in nodes),
+        ("remote_get_values", "remote_announce_peer")
+    )
+
+    searches = {}
+    for info_hash, announcer in torrents.items():
+        searcher = rnd.choice(nodes)
+        while searcher is announcer or searcher in searches:
+            searcher = rnd.choice(nodes)
+
+        searches[searcher] = (info_hash, network.addr(nodes.index(announcer)))
+
+    await measure(
+        "get_peers", list(searches), lambda node: node[searches[node][0]], args.concurrency,
+        lambda node, peers: searches[node][1] in peers, ("remote_get_values",)
+    )
+
+    print(f"datagrams sent: {network.sent:,}, lost: {network.lost:,}")
+
+    for node in nodes:
+        await node.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="bootstrap, announce and get_peers on a simulated network of DHTs")
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--lookups", type=int, default=200, help="number of announces and get_peers lookups")
+    parser.add_argument("--concurrency", type=int, default=50, help="lookups running at once")
+    parser.add_argument("--min-latency", type=float, default=0.005)
+    parser.add_argument("--max-latency", type=float, default=0.05)
+    parser.add_argument("--loss", type=float, default=0.0, help="datagram loss probability")
+    parser.add_argument("--timeout", type=float, default=60, help="lookup deadline in seconds")
+    parser.add_argument("--settle", type=float, default=5, help="delay between bootstrap and lookups in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+import random
+from socket import inet_ntoa
+from timeit import timeit
+
+from aiobtdht.tokens import TokenManager
+from aiobtdht.utils import calc_sha1
+from aiobtdht.utils import random as random_bytes
+
+
+class LegacyTokens:
+    # Token generation of aio-btdht 0.0.9: SHA-1 over `str(addr)` and one of ten salts
+    def __init__(self):
+        self.salts = [calc_sha1(random_bytes(128)) for _ in range(10)]
+
+    def _gen_tokens(self, addr):
+        for salt in self.salts:
+            yield calc_sha1(b"".join((bytes(str(addr), "utf-8"), salt)))
+
+    def get(self, addr):
+        return next(self._gen_tokens(addr))
+
+    def check(self, addr, token):
+        return any(token == t for t in self._gen_tokens(addr))
+
+
+def run(name, tokens, addrs, number):
+    def gen():
+        for addr in addrs:
+            tokens.get(addr)
+
+    def check():
+        for addr in addrs:
+            tokens.check(addr, b"bad token")
+
+    for op, f in (("get", gen), ("check (miss)", check)):
+        elapsed = timeit(f, number=number)
+        print(f"{name:>16} {op:>14} {len(addrs) * number / elapsed:>14,.0f} tokens/sec")
+
+
+def main():
+    rnd = random.Random(0)
+    addrs = [(inet_ntoa(rnd.getrandbits(32).to_bytes(4, "big")), rnd.randrange(1, 65536)) for _ in range(10000)]
+    hot_addrs = addrs[:100] * 100
+
+    run("legacy", LegacyTokens(), addrs, 5)
+
+    tokens = TokenManager()
+    tokens.rotate()
+    run("uncached", tokens, addrs, 1)
+    run("cached", tokens, hot_addrs, 5)
+
+
+if __name__ == "__main__":
+    main()
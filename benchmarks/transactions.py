@@ -0,0 +1,95 @@
+import argparse
+import asyncio
+import random
+from time import monotonic
+from time import process_time
+
+from aiokrpc import KRPCServer
+
+from aiobtdht import DHT
+from aiobtdht.simulator import Endpoint
+from aiobtdht.simulator import Network
+from aiobtdht.utils import call_timeout
+
+
+class LegacyDHT(DHT):
+    # Outbound path before `TransactionTable`: a queue and a `wait_for` task and timer per request
+    async def _catch_response(self, key):
+        queue = asyncio.Queue()
+
+        self.requests[key] = queue
+        try:
+            rt, response = await queue.get()
+            return response
+        finally:
+            self.requests.pop(key)
+
+    async def _query(self, addr, method, kwargs, timeout):
+        sent = self.loop.time()
+        result = await call_timeout(KRPCServer.call_remote(self, addr, method, **kwargs), timeout, None)
+        return None if result is None else (*result, sent)
+
+    _ensure_query = KRPCServer._ensure_query
+    _handle_response = KRPCServer._handle_response
+    _handle_error_response = KRPCServer._handle_error_response
+
+
+async def run(name, args, cls, **kwargs):
+    # `args.requests` pings of `args.servers` nodes sent at once by one client
+    loop = asyncio.get_event_loop()
+    rnd = random.Random(args.seed)
+    network = Network(latency=(args.min_latency, args.max_latency), loss=args.loss, seed=args.seed)
+
+    servers = []
+    for i in range(args.servers):
+        endpoint = Endpoint(network)
+        endpoint.run(*network.addr(i + 1), loop=loop)
+        servers.append(DHT(rnd.getrandbits(160), endpoint, loop))
+
+    endpoint = Endpoint(network)
+    endpoint.run(*network.addr(0), loop=loop)
+    client = cls(rnd.getrandbits(160), endpoint, loop, **kwargs)
+
+    addrs = [network.addr(i + 1) for i in range(args.servers)]
+    tasks = len(asyncio.all_tasks(loop))
+    peak_tasks = 0
+
+    async def sample_tasks():
+        nonlocal peak_tasks
+        while True:
+            peak_tasks = max(peak_tasks, len(asyncio.all_tasks(loop)) - tasks - 2)
+            await asyncio.sleep(0.01)
+
+    sampler = asyncio.ensure_future(sample_tasks())
+    started, cpu_started = monotonic(), process_time()
+    results = await asyncio.gather(
+        *(client.remote_ping(addrs[i % len(addrs)], timeout=args.timeout) for i in range(args.requests))
+    )
+    elapsed, cpu = monotonic() - started, process_time() - cpu_started
+    sampler.cancel()
+
+    for node in servers + [client]:
+        await node.close()
+
+    print(f"{name:<28} {args.requests / elapsed:>8,.0f} RPC/sec, CPU: {cpu / args.requests * 1e6:>5.0f} us/RPC, "
+          f"responses: {sum(bool(it) for it in results) / args.requests:.1%}, peak tasks: {peak_tasks}")
+
+
+async def main(args):
+    await run("wait_for per request", args, LegacyDHT)
+    await run("transaction table", args, DHT, query_window=args.window, query_rate=args.rate)
+    await run("transaction table, no limits", args, DHT, query_window=args.requests, query_rate=0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="outbound RPC rate and event loop overhead of a large fan-out")
+    parser.add_argument("--servers", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=20000, help="pings sent at once")
+    parser.add_argument("--window", type=int, default=16, help="requests in flight per destination")
+    parser.add_argument("--rate", type=int, default=5000, help="datagrams per second")
+    parser.add_argument("--timeout", type=float, default=10)
+    parser.add_argument("--min-latency", type=float, default=0.005)
+    parser.add_argument("--max-latency", type=float, default=0.05)
+    parser.add_argument("--loss", type=float, default=0.0, help="datagram loss probability")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,92 @@
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import time
+
+from bencode import bdecode
+from bencode import bencode
+
+from aiobtdht.workers import WorkerPool
+
+
+def generate_load(addrs, duration, window, seed, result):
+    # Keep `window` queries in flight to every worker address, count responses
+    rnd = random.Random(seed)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(0.05)
+
+    def send(addr):
+        query = bencode({
+            "t": rnd.getrandbits(16).to_bytes(2, "big"), "y": "q", "q": "find_node",
+            "a": {"id": rnd.getrandbits(160).to_bytes(20, "big"), "target": rnd.getrandbits(160).to_bytes(20, "big")}
+        })
+        sock.sendto(query, addr)
+
+    responses = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        for addr in addrs:
+            for _ in range(window):
+                send(addr)
+
+        while True:
+            try:
+                data, addr = sock.recvfrom(65536)
+            except socket.timeout:
+                break  # Some datagrams are lost, fill the window again
+
+            if bdecode(data).get(b"y") == b"r":
+                responses += 1
+                send(addr)
+
+            if time.monotonic() >= deadline:
+                break
+
+    result.put(responses)
+
+
+def measure(workers, args):
+    pool = WorkerPool(
+        [random.getrandbits(160) for _ in range(workers * args.ids_per_worker)],
+        host="127.0.0.1", port=args.port, workers=workers
+    )
+    pool.start()
+    time.sleep(args.warmup)
+
+    try:
+        result = multiprocessing.Queue()
+        generators = [
+            multiprocessing.Process(target=generate_load, args=(pool.addrs, args.duration, args.window, i, result))
+            for i in range(args.generators)
+        ]
+        for generator in generators:
+            generator.start()
+
+        responses = sum(result.get() for _ in generators)
+        for generator in generators:
+            generator.join()
+
+        return responses / args.duration
+    finally:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="find_node queries/sec served by 1..N worker processes on loopback")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--ids-per-worker", type=int, default=4)
+    parser.add_argument("--generators", type=int, default=2, help="load generator processes")
+    parser.add_argument("--window", type=int, default=32, help="queries in flight per generator and worker")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--warmup", type=float, default=2, help="delay for workers to start in seconds")
+    parser.add_argument("--port", type=int, default=16881)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in range(1, args.max_workers + 1):
+        rate = measure(workers, args)
+        baseline = baseline or rate
+        print(f"workers: {workers}, queries/sec: {rate:,.0f}, speedup: {rate / baseline:.2f}x")
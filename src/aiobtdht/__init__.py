@@ -1,8 +1,21 @@
-from aiobtdht.dht import DHT
-from distutils.version import LooseVersion
+from importlib import import_module
 
 __version__ = "0.0.9"
-__version_info__ = tuple(LooseVersion(__version__).version)
+__version_info__ = tuple(int(part) if part.isdigit() else part for part in __version__.split("."))
 __all__ = [
     "DHT"
-]
\ No newline at end of file
+]
+
+# Public names are imported on first access, so submodules (`aiobtdht.utils`, `aiobtdht.security`, ...) don't
+# pull in `aiokrpc` and the KRPC schemas
+_LAZY = {
+    "DHT": ".dht"
+}
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    return getattr(import_module(module, __name__), name)
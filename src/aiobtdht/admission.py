@@ -0,0 +1,110 @@
+import asyncio
+from collections import OrderedDict
+
+from .utils import RateLimiter
+
+
+class Admission:
+    # Contacts of inbound queries are verified with `ping` before they get into the routing table.
+    # Pending verifications are coalesced by (id, addr), ping rate, pings in flight and queue depth are
+    # bounded. Contacts with ids rejected by `verifier` (BEP 42) are dropped, ids which are not preferred
+    # are queued only while the queue is less than half full.
+    def __init__(self, routing_table, ping, rate=50, max_in_flight=16, max_queue_size=1024, verifier=None):
+        self._routing_table = routing_table
+        self._ping = ping  # Coroutine function `ping(addr)`, result is `(addr, data)` or `None`
+        self._verifier = verifier
+        self._limiter = RateLimiter(rate)
+        self._max_in_flight = max_in_flight
+        self._max_queue_size = max_queue_size
+
+        self._queue = OrderedDict()  # (id, addr) -> None
+        self._in_flight = set()
+        self._workers = set()
+
+        self._coalesced = 0
+        self._dropped = 0
+        self._verified = 0
+        self._failed = 0
+        self._rejected = 0
+
+    async def _work(self):
+        while self._queue:
+            await self._limiter.acquire()
+            if not self._queue:
+                break
+
+            key, _ = self._queue.popitem(last=False)
+            self._in_flight.add(key)
+            try:
+                response = await self._ping(key[1])
+            finally:
+                self._in_flight.discard(key)
+
+            if response and not self._is_rejected(response[1]["id"], key[1]):
+                self._routing_table.add(response[1]["id"], key[1])
+                self._verified += 1
+            elif response:
+                self._rejected += 1
+            else:
+                self._failed += 1
+
+    def _is_rejected(self, id_, addr):
+        return self._verifier is not None and not self._verifier.accept(id_, addr)
+
+    def submit(self, id_, addr):
+        key = (id_, addr)
+
+        if self._is_rejected(id_, addr):
+            self._rejected += 1
+        elif key in self._routing_table:
+            self._routing_table.add(id_, addr)
+        elif key in self._queue or key in self._in_flight:
+            self._coalesced += 1
+        elif len(self._queue) >= self._max_queue_size or (
+                self._verifier is not None and self._verifier.rank(id_, addr)
+                and len(self._queue) * 2 >= self._max_queue_size):
+            self._dropped += 1
+        else:
+            self._queue[key] = None
+
+            if len(self._workers) < self._max_in_flight:
+                worker = asyncio.ensure_future(self._work())
+                worker.add_done_callback(self._workers.discard)
+                self._workers.add(worker)
+
+    def close(self):
+        # Cancel workers and drop queued contacts, result is the list of cancelled workers to await
+        workers = list(self._workers)
+        for worker in workers:
+            worker.cancel()
+
+        self._queue.clear()
+        return workers
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
+
+    @property
+    def coalesced(self):
+        return self._coalesced
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    @property
+    def verified(self):
+        return self._verified
+
+    @property
+    def failed(self):
+        return self._failed
+
+    @property
+    def rejected(self):
+        return self._rejected
@@ -0,0 +1,172 @@
+import asyncio
+from collections import OrderedDict
+from collections import deque
+from math import ceil
+from math import log
+from random import getrandbits
+from time import monotonic
+
+from .utils import RateLimiter
+from .utils import encode_id
+
+
+class BloomFilter:
+    # Bloom filter of 160-bit ids. Ids are SHA-1 hashes already, so bit positions are derived from the
+    # id itself by double hashing. Two generations are kept: when the current one is full it replaces the
+    # previous one, so memory and false positive rate stay bounded for endless streams.
+    def __init__(self, capacity=1000000, error_rate=0.001):
+        self._capacity = capacity
+        self._size = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        self._hashes = max(1, round(self._size / capacity * log(2)))
+
+        self._current = bytearray((self._size + 7) // 8)
+        self._previous = bytearray(len(self._current))
+        self._count = 0
+
+    def _positions(self, id_):
+        h1 = id_ & 0xFFFFFFFFFFFFFFFF
+        h2 = (id_ >> 64) & 0xFFFFFFFFFFFFFFFF | 1
+        return [(h1 + i * h2) % self._size for i in range(self._hashes)]
+
+    @staticmethod
+    def _contains(bits, positions):
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+
+    def add(self, id_):
+        # Result is `False` when id is (probably) seen already
+        positions = self._positions(id_)
+        if self._contains(self._current, positions) or self._contains(self._previous, positions):
+            return False
+
+        if self._count >= self._capacity:
+            self._previous, self._current = self._current, bytearray(len(self._current))
+            self._count = 0
+
+        for p in positions:
+            self._current[p >> 3] |= 1 << (p & 7)
+
+        self._count += 1
+        return True
+
+    def __contains__(self, id_):
+        positions = self._positions(id_)
+        return self._contains(self._current, positions) or self._contains(self._previous, positions)
+
+
+class Crawler:
+    # BEP 51 crawler: queries nodes with `sample_infohashes` for random targets, feeds returned nodes back
+    # into the visit queue, respects `interval` of each node and yields unique info_hashes.
+    def __init__(self, dht, rate=100, concurrency=32, capacity=1000000, max_queue_size=10000,
+                 max_known_nodes=100000, min_interval=60):
+        self._dht = dht
+        self._limiter = RateLimiter(rate)
+        self._concurrency = concurrency
+        self._filter = BloomFilter(capacity)
+        self._max_queue_size = max_queue_size
+        self._max_known_nodes = max_known_nodes
+        self._min_interval = min_interval
+
+        self._queue = deque()  # Nodes to visit: (id, addr)
+        self._next_visit = OrderedDict()  # addr -> time of next allowed visit
+
+        self._rpc_count = 0
+        self._responses = 0
+        self._samples = 0
+        self._unique = 0
+
+    def _enqueue(self, nodes):
+        now = monotonic()
+        for id_, addr in nodes:
+            if len(self._queue) >= self._max_queue_size:
+                break
+
+            if self._next_visit.get(addr, 0) <= now:
+                self._queue.append((id_, addr))
+
+    def _schedule(self, addr, interval):
+        self._next_visit.pop(addr, None)
+        self._next_visit[addr] = monotonic() + max(interval, self._min_interval)
+
+        if len(self._next_visit) > self._max_known_nodes:
+            self._next_visit.popitem(last=False)
+
+    async def _work(self, output, stopped):
+        try:
+            await self._visit_nodes(output, stopped)
+        except Exception as e:
+            # Failure is passed to `crawl` instead of leaving it waiting for samples forever
+            await output.put(e)
+
+    async def _visit_nodes(self, output, stopped):
+        while not stopped.is_set():
+            if not self._queue:
+                self._enqueue(self._dht.routing_table[(getrandbits(160), 8)])
+
+                if not self._queue:
+                    await asyncio.sleep(1)
+                    continue
+
+            _, addr = self._queue.popleft()
+            if self._next_visit.get(addr, 0) > monotonic():
+                continue
+
+            await self._limiter.acquire()
+
+            self._schedule(addr, 0)
+            self._rpc_count += 1
+            response = await self._dht.remote_sample_infohashes(addr, getrandbits(160))
+            if stopped.is_set():
+                break
+
+            if not response:
+                continue
+
+            data = response[1]
+            self._responses += 1
+            self._schedule(addr, data.get("interval", 0))
+            self._enqueue(data.get("nodes", ()))
+            self._enqueue(data.get("nodes6", ()))
+
+            for sample in data.get("samples", ()):
+                self._samples += 1
+                if self._filter.add(sample):
+                    self._unique += 1
+                    await output.put(encode_id(sample))
+
+    async def crawl(self):
+        output = asyncio.Queue(maxsize=1024)
+        stopped = asyncio.Event()
+        workers = [asyncio.ensure_future(self._work(output, stopped)) for _ in range(self._concurrency)]
+
+        try:
+            while True:
+                item = await output.get()
+                if isinstance(item, Exception):
+                    raise item
+
+                yield item
+        finally:
+            # `wait_for` may swallow cancellation of a worker when its RPC completes at the same moment
+            # (bpo-42130), so workers also check `stopped` after every RPC
+            stopped.set()
+            for worker in workers:
+                worker.cancel()
+
+            # In-flight RPCs of the workers must not outlive the generator
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    @property
+    def rpc_count(self):
+        return self._rpc_count
+
+    @property
+    def responses(self):
+        return self._responses
+
+    @property
+    def samples(self):
+        return self._samples
+
+    @property
+    def unique(self):
+        return self._unique
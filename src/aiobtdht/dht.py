@@ -1,12 +1,30 @@
 import asyncio
-from collections import namedtuple
-from datetime import datetime
+import logging
+from time import monotonic
+from time import perf_counter
 
 from aiokrpc import KRPCServer
 from aiokrpc.exceptions import KRPCErrorResponse
+from aiokrpc.exceptions import KRPCGenericError
 from aiokrpc.exceptions import KRPCProtocolError
-
+from aiokrpc.protocol_schemas import COMMON_SCHEMA
+from aiokrpc.protocol_schemas import ERROR_SCHEMA
+from aiokrpc.protocol_schemas import QUERY_SCHEMA
+from aiokrpc.protocol_schemas import RESPONSE_SCHEMA
+
+from .admission import Admission
+from .lookup import Lookup
+from .lookup import LookupCache
+from .lookup import QueryPool
+from .metrics import COUNT_BUCKETS
+from .metrics import Metrics
+from .peer_store import PeerStore
+from .refresh import RefreshScheduler
 from .routing_table import RoutingTable
+from .routing_table import dumps_snapshot
+from .routing_table import loads_snapshot
+from .rtt import RttTracker
+from .security import NodeIdVerifier
 from .schemas import ANNOUNCE_PEER_ARGS
 from .schemas import ANNOUNCE_PEER_ARGS_REMOTE
 from .schemas import ANNOUNCE_PEER_RESULT
@@ -23,15 +41,25 @@ from .schemas import PING_ARGS
 from .schemas import PING_ARGS_REMOTE
 from .schemas import PING_RESULT
 from .schemas import PING_RESULT_REMOTE
+from .schemas import SAMPLE_INFOHASHES_ARGS
 from .schemas import SAMPLE_INFOHASHES_ARGS_REMOTE
+from .schemas import SAMPLE_INFOHASHES_RESULT
 from .schemas import SAMPLE_INFOHASHES_RESULT_REMOTE
-from .utils import calc_sha1
-from .utils import call_timeout
+from .tokens import TokenManager
+from .transactions import TransactionTable
 from .utils import decode_info_hash
-from .utils import random
+from .utils import is_ipv6
+from .utils import merge
 from .utils import run_every
+from .utils import write_file_atomic
+from .validator import Schema
+
+logger = logging.getLogger(__name__)
 
-PeerInfo = namedtuple("peer_info", ["addr", "port", "implied_port", "added"])
+# KRPC message schemas of `aiokrpc`, compiled once for `DHT._apply_schema`
+_PROTOCOL_SCHEMAS = {
+    id(schema): Schema(schema) for schema in (COMMON_SCHEMA, QUERY_SCHEMA, RESPONSE_SCHEMA, ERROR_SCHEMA)
+}
 
 
 class ArgsError(Exception):
@@ -42,96 +70,286 @@ class ResultError(Exception):
     pass
 
 
+class TokenError(KRPCProtocolError):
+    pass
+
+
 class DHT(KRPCServer):
-    def __init__(self, local_id, server, loop):
+    def __init__(self, local_id, server, loop, peer_store=None, alpha=3, lookup_timeout=60, snapshot_path=None,
+                 snapshot_interval=5 * 60, sample_interval=6 * 60 * 60, metrics=None,
+                 secure_ids="prefer", max_nodes_per_subnet=2, ipv6=False, lookup_cache=None,
+                 query_window=16, query_rate=5000, query_burst=512, compact=False):
+        # Bound once, so `close` unsubscribes the same object `KRPCServer` subscribes
+        self._parse_datagram = self._parse_datagram
         super().__init__(server=server, loop=loop)
 
         self.id = local_id
-        self.routing_table = RoutingTable(local_id)
+        self.local_ids = frozenset((local_id,))
+        self.alpha = alpha
+        self.lookup_timeout = lookup_timeout
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.sample_interval = sample_interval
+        self.ipv6 = ipv6  # Run IPv6 lookups, server must be able to send datagrams to IPv6 addresses
+
+        # Separate routing tables for IPv4 and IPv6 nodes (BEP 32)
+        self.verifier = NodeIdVerifier(secure_ids)
+        self.routing_table = RoutingTable(local_id, compact=compact, max_nodes_per_subnet=max_nodes_per_subnet)
+        self.admission = Admission(self.routing_table, self.remote_ping, verifier=self.verifier)
+        self.refresh_scheduler = RefreshScheduler(
+            self.routing_table, self.remote_ping, self.remote_find_node, self.admission.submit
+        )
+        self.routing_table6 = RoutingTable(local_id, compact=compact, max_nodes_per_subnet=max_nodes_per_subnet)
+        self.admission6 = Admission(self.routing_table6, self.remote_ping, verifier=self.verifier)
+        self.refresh_scheduler6 = RefreshScheduler(
+            self.routing_table6, self.remote_ping, self.remote_find_node, self.admission6.submit, nodes_key="nodes6"
+        )
 
-        self.torrents = {}
-        self.salts = []
+        self.torrents = PeerStore() if peer_store is None else peer_store
+        self.lookup_cache = LookupCache() if lookup_cache is None else lookup_cache
+        self.tokens = TokenManager()
+        self.rtt = RttTracker()
+        self.transactions = TransactionTable(
+            self.server.send, loop, window=query_window, rate=query_rate, burst=query_burst
+        )
+        self.metrics = Metrics() if metrics is None else metrics
+        self._register_metrics()
 
         # region Callbacks registration
         self.register_callback(self.ping, arg_schema=PING_ARGS, result_schema=PING_RESULT)
         self.register_callback(self.find_node, arg_schema=FIND_NODE_ARGS, result_schema=FIND_NODE_RESULT)
         self.register_callback(self.get_peers, arg_schema=GET_PEERS_ARGS, result_schema=GET_PEERS_RESULT)
         self.register_callback(self.announce_peer, arg_schema=ANNOUNCE_PEER_ARGS, result_schema=ANNOUNCE_PEER_RESULT)
+        self.register_callback(
+            self.sample_infohashes, arg_schema=SAMPLE_INFOHASHES_ARGS, result_schema=SAMPLE_INFOHASHES_RESULT
+        )
         # endregion
 
+        # Periodic and background tasks, started by `start`
+        self._tasks = set()
+        self._started = False
+
+    def _register_metrics(self):
+        tables = (("ipv4", self.routing_table), ("ipv6", self.routing_table6))
+
+        def bucket_occupancy():
+            # Number of buckets by number of nodes in them
+            result = {}
+            for family, rt in tables:
+                for size in rt.bucket_sizes():
+                    key = (("family", family), ("nodes", size))
+                    result[key] = result.get(key, 0) + 1
+
+            return result
+
+        def admission(name):
+            return lambda: getattr(self.admission, name) + getattr(self.admission6, name)
+
+        for name, f, type_ in (
+                ("dht_routing_table_nodes", lambda: {(("family", family),): len(rt) for family, rt in tables}, "gauge"),
+                ("dht_routing_table_buckets", bucket_occupancy, "gauge"),
+                ("dht_peer_store_torrents", lambda: len(self.torrents), "gauge"),
+                ("dht_peer_store_peers", lambda: self.torrents.size, "gauge"),
+                ("dht_peer_store_evictions_total", lambda: self.torrents.evictions, "counter"),
+                ("dht_peer_store_rejected_total", lambda: self.torrents.rejected, "counter"),
+                ("dht_admission_queue_depth", admission("queue_depth"), "gauge"),
+                ("dht_admission_in_flight", admission("in_flight"), "gauge"),
+                ("dht_admission_coalesced_total", admission("coalesced"), "counter"),
+                ("dht_admission_dropped_total", admission("dropped"), "counter"),
+                ("dht_admission_verified_total", admission("verified"), "counter"),
+                ("dht_admission_failed_total", admission("failed"), "counter"),
+                ("dht_admission_rejected_total", admission("rejected"), "counter"),
+                ("dht_lookup_cache_entries", lambda: len(self.lookup_cache), "gauge"),
+                ("dht_lookup_cache_hits_total", lambda: self.lookup_cache.hits, "counter"),
+                ("dht_lookup_cache_misses_total", lambda: self.lookup_cache.misses, "counter"),
+                ("dht_lookup_cache_merged_total", lambda: self.lookup_cache.merged, "counter"),
+                ("dht_transactions_pending", lambda: self.transactions.pending, "gauge"),
+                ("dht_transactions_waiting", lambda: self.transactions.waiting, "gauge"),
+                ("dht_send_queue_depth", lambda: self.transactions.send_queue_depth, "gauge"),
+                ("dht_refresh_pings_total",
+                 lambda: self.refresh_scheduler.pings + self.refresh_scheduler6.pings, "counter"),
+                ("dht_refresh_dropped_total",
+                 lambda: self.refresh_scheduler.dropped + self.refresh_scheduler6.dropped, "counter")):
+            self.metrics.collect(name, f, type_)
+
+    def _run_future(self, *args):
+        for fut in args:
+            task = asyncio.ensure_future(fut)
+            task.add_done_callback(self._tasks.discard)
+            self._tasks.add(task)
+
+    # region Lifecycle
+    def start(self):
+        # Load snapshot and start periodic tasks, must be called in the event loop
+        if self._started:
+            return
+
+        self._started = True
         for args in (
                 (self._refresh_nodes, 60),
-                (self._rotate_salts, 60),
+                (self._rotate_salts, 5 * 60),
                 (self._forget_torrents, 60)):
             self._run_every(*args)
 
-    def _run_future(self, *args):
-        for fut in args:
-            asyncio.ensure_future(fut)
+        if self.snapshot_path:
+            self._load_snapshot()
+            self._run_every(self.save_snapshot, self.snapshot_interval)
+
+    async def stop(self):
+        # Cancel periodic tasks and contact verification, node keeps answering queries and may be started again
+        self._started = False
+
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+
+        tasks += self.admission.close() + self.admission6.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def close(self):
+        # Stop and detach from the server, pending queries are cancelled
+        await self.stop()
+        self.transactions.close()
+        self.server.unsubscribe(self._parse_datagram)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    # endregion
 
     # region Server methods
     def ping(self, addr, id):
-        self._run_future(self._add_or_update_node(id, addr))
+        self._admission(addr).submit(id, addr)
 
-        return self._get_result_id()
+        return self._get_result_id(id)
 
-    def find_node(self, addr, id, target):
-        self._run_future(self._add_or_update_node(id, addr))
+    def find_node(self, addr, id, target, want=None):
+        self._admission(addr).submit(id, addr)
 
         return {
-            "nodes": self.routing_table[target],
-            **self._get_result_id()
+            **self._get_result_nodes(addr, target, want),
+            **self._get_result_id(target)
         }
 
-    def get_peers(self, addr, id, info_hash):
-        self._run_future(self._add_or_update_node(id, addr))
+    def get_peers(self, addr, id, info_hash, want=None):
+        self._admission(addr).submit(id, addr)
 
-        peers = self.torrents.get(info_hash, None)
+        # Peers of the requester address family only
+        ipv6 = is_ipv6(addr[0])
+        peers = [peer for peer in self.torrents.sample(info_hash) if is_ipv6(peer[0]) == ipv6]
         if peers:
             return {
-                **self._get_result_id(), **self._get_result_token(addr),
-                "values": [(peer.addr[0], peer.addr[1] if peer.implied_port else peer.port) for peer in peers]
+                **self._get_result_id(info_hash), **self._get_result_token(addr),
+                "values": peers
             }
         else:
-            return {**self.find_node(addr, id, info_hash), **self._get_result_token(addr)}
+            return {
+                **self._get_result_nodes(addr, info_hash, want), **self._get_result_id(info_hash),
+                **self._get_result_token(addr)
+            }
 
-    def announce_peer(self, addr, id, info_hash, port, token, implied_port=0):
-        self._run_future(self._add_or_update_node(id, addr))
+    def announce_peer(self, addr, id, info_hash, token, port=None, implied_port=0):
+        self._admission(addr).submit(id, addr)
+
+        if port is None and not implied_port:
+            raise KRPCProtocolError("Port is required when implied_port is not set")
 
         if self._check_token(addr, token):
-            self.torrents.setdefault(info_hash, set()).add(
-                PeerInfo(
-                    addr=addr,
-                    port=port,
-                    implied_port=implied_port,
-                    added=datetime.now()
-                )
-            )
-            return self._get_result_id()
+            self.torrents.add(info_hash, (addr[0], addr[1] if implied_port else port))
+            return self._get_result_id(info_hash)
         else:
-            raise KRPCProtocolError("Bad token")
+            raise TokenError("Bad token")
+
+    def sample_infohashes(self, addr, id, target, want=None):
+        self._admission(addr).submit(id, addr)
+
+        return {
+            **self._get_result_id(target),
+            **self._get_result_nodes(addr, target, want),
+            "interval": self.sample_interval,
+            "num": len(self.torrents),
+            "samples": self.torrents.sample_info_hashes()
+        }
 
     # endregion
 
     # region Utils
-    def _get_result_id(self):
-        return {"id": self.id}
+    def _local_id(self, target=None):
+        # Id to answer queries about `target` and to query about it
+        return self.id
+
+    def _get_result_id(self, target=None):
+        return {"id": self._local_id(target)}
 
-    def _gen_tokens(self, addr):
-        for salt in self.salts:
-            yield calc_sha1(b"".join((bytes(str(addr), "utf-8"), salt)))
+    def _get_result_nodes(self, addr, target, want=None):
+        # Nodes of families listed in `want` (BEP 32), of the requester address family by default
+        if not want:
+            want = (b"n6",) if is_ipv6(addr[0]) else (b"n4",)
+
+        result = {}
+        if b"n4" in want:
+            result["nodes"] = self.routing_table[target]
+        if b"n6" in want:
+            result["nodes6"] = self.routing_table6[target]
+
+        return result
+
+    def _admission(self, addr):
+        return self.admission6 if is_ipv6(addr[0]) else self.admission
+
+    def _get_args_want(self):
+        # Ask for nodes of both families (BEP 32), so IPv4 nodes seed the IPv6 routing table and vice versa
+        return {"want": [b"n4", b"n6"]} if self.ipv6 else {}
+
+    def _admit_other_family(self, addr, result):
+        # Nodes of the other address family than `addr` aren't used by the lookup, verify them into their table
+        if result is None or not self.ipv6:
+            return
+
+        for node_id, node_addr in result[1].get("nodes" if is_ipv6(addr[0]) else "nodes6", ()):
+            self._admission(node_addr).submit(node_id, node_addr)
 
     def _gen_token(self, addr):
-        return next(self._gen_tokens(addr))
+        return self.tokens.get(addr)
 
     def _get_result_token(self, addr):
         return {"token": self._gen_token(addr)}
 
     def _check_token(self, addr, token):
-        return any(token == t for t in self._gen_tokens(addr))
+        return self.tokens.check(addr, token)
+
+    def _apply_schema(self, obj, schema, on_error, allow_unknown=True):
+        schema = _PROTOCOL_SCHEMAS.get(id(schema), schema)
+
+        if isinstance(schema, Schema):
+            document, errors = schema.validate(obj, allow_unknown)
+            return on_error(errors) if errors else document
+
+        return super()._apply_schema(obj, schema, on_error, allow_unknown)
+
+    async def _handle_query(self, addr, q, a):
+        method = q if q in self.callbacks else "unknown"
+        self.metrics.counter("dht_queries_received_total", method=method).inc()
+
+        started = perf_counter() if self.metrics.profile else None
+        try:
+            return await super()._handle_query(addr, q, a)
+        except TokenError:
+            self.metrics.counter("dht_bad_tokens_total").inc()
+            raise
+        except KRPCProtocolError:
+            self.metrics.counter("dht_schema_errors_total", direction="in", method=method).inc()
+            raise
+        finally:
+            if started is not None:
+                self.metrics.histogram("dht_callback_seconds", method=method).observe(perf_counter() - started)
 
     def _add_node(self, node_id, addr):
-        self.routing_table.add(node_id, addr)
+        (self.routing_table6 if is_ipv6(addr[0]) else self.routing_table).add(node_id, addr)
 
     def _run_every(self, f, delay):
         self._run_future(run_every(f, delay))
@@ -143,176 +361,290 @@ class DHT(KRPCServer):
     # endregion
 
     # region Remote calls
-    async def _remote_call(self, addr, method, kwargs, timeout=3, arg_schema=None, result_schema=None):
+    def _query(self, addr, method, kwargs, timeout):
+        # Future of `(addr, response, sent)` or `None` on timeout, raises `KRPCErrorResponse` on error response
+        return self.transactions.request(
+            addr, lambda t: self._encode({"t": t, "y": "q", "q": method, "a": kwargs, "v": self.server_version()}),
+            timeout
+        )
+
+    async def _ensure_query(self, addr, method, **kwargs):
+        # `KRPCServer.call_remote` behaviour, timeout raises `asyncio.TimeoutError`
+        result = await self._query(addr, method, kwargs, 30)
+        if result is None:
+            raise asyncio.TimeoutError()
+
+        return result[:2]
+
+    def _handle_response(self, addr, t, r):
+        if not self.transactions.resolve(addr, t, r):
+            raise KRPCGenericError()
+
+    def _handle_error_response(self, addr, t, e):
+        if not self.transactions.resolve(addr, t, error=KRPCErrorResponse((addr, e))):
+            raise KRPCGenericError()
+
+    async def _remote_call(self, addr, method, kwargs, timeout=None, arg_schema=None, result_schema=None):
+        # Timeout is derived from response times of `addr` when `None`
         def _args_error(e):
             raise ArgsError()
 
         def _result_error(e):
             raise ResultError()
 
+        self.metrics.counter("dht_queries_sent_total", method=method).inc()
+
         try:
-            result = await call_timeout(
-                self.call_remote(
-                    addr, method, **self._apply_schema(kwargs, arg_schema or {}, _args_error)
-                ), timeout, None
+            result = await self._query(
+                addr, method, self._apply_schema(kwargs, arg_schema or {}, _args_error),
+                self.rtt.timeout(addr) if timeout is None else timeout
             )
             if result:
+                # Measured from the moment the datagram was sent, not including the send queue wait
+                rtt = self.loop.time() - result[2]
+                self.rtt.renew(addr, rtt)
+                self.metrics.histogram("dht_query_rtt_seconds", method=method).observe(rtt)
                 return result[0], self._apply_schema(result[1], result_schema or {}, _result_error)
 
+            # Deadline starts when the datagram is sent, so queries cancelled unsent never get here
+            self.rtt.fail(addr)
+            self.metrics.counter("dht_query_timeouts_total", method=method).inc()
+            return None
+        except KRPCErrorResponse:
+            self.metrics.counter("dht_query_errors_total", method=method).inc()
             return None
-        except (KRPCErrorResponse, ResultError):
+        except ResultError:
+            self.metrics.counter("dht_schema_errors_total", direction="out", method=method).inc()
             return None
 
-    async def remote_ping(self, addr, timeout=3):
+    async def remote_ping(self, addr, timeout=None):
         return await self._remote_call(
             addr, "ping",
-            kwargs={"id": self.id},
+            kwargs={"id": self._local_id()},
             timeout=timeout,
             arg_schema=PING_ARGS_REMOTE,
             result_schema=PING_RESULT_REMOTE
         )
 
-    async def remote_find_node(self, addr, target_id, timeout=3):
-        return await self._remote_call(
+    async def remote_find_node(self, addr, target_id, timeout=None):
+        result = await self._remote_call(
             addr, "find_node",
-            kwargs={"id": self.id, "target": target_id},
+            kwargs={"id": self._local_id(target_id), "target": target_id, **self._get_args_want()},
             timeout=timeout,
             arg_schema=FIND_NODE_ARGS_REMOTE,
             result_schema=FIND_NODE_RESULT_REMOTE
         )
+        self._admit_other_family(addr, result)
+        return result
 
-    async def remote_get_values(self, addr, info_hash, timeout=3):
-        return await self._remote_call(
+    async def remote_get_values(self, addr, info_hash, timeout=None):
+        result = await self._remote_call(
             addr, "get_peers",
-            kwargs={"id": self.id, "info_hash": info_hash},
+            kwargs={"id": self._local_id(info_hash), "info_hash": info_hash, **self._get_args_want()},
             timeout=timeout,
             arg_schema=GET_PEERS_ARGS_REMOTE,
             result_schema=GET_PEERS_RESULT_REMOTE
         )
+        self._admit_other_family(addr, result)
+        return result
 
-    async def remote_announce_peer(self, addr, info_hash, port, token, implied_port, timeout=3):
+    async def remote_announce_peer(self, addr, info_hash, port, token, implied_port, timeout=None):
         return await self._remote_call(
             addr, "announce_peer",
-            kwargs={"id": self.id, "info_hash": info_hash, "port": port, "token": token, "implied_port": implied_port},
+            kwargs={
+                "id": self._local_id(info_hash), "info_hash": info_hash, "port": port, "token": token,
+                "implied_port": implied_port
+            },
             timeout=timeout,
             arg_schema=ANNOUNCE_PEER_ARGS_REMOTE,
             result_schema=ANNOUNCE_PEER_RESULT_REMOTE
         )
 
-    async def remote_sample_infohashes(self, addr, target_id, timeout=3):
+    async def remote_sample_infohashes(self, addr, target_id, timeout=None):
         return await self._remote_call(
             addr, "sample_infohashes",
-            kwargs={"id": self.id, "target": target_id},
+            kwargs={"id": self._local_id(target_id), "target": target_id},
             timeout=timeout,
             arg_schema=SAMPLE_INFOHASHES_ARGS_REMOTE,
             result_schema=SAMPLE_INFOHASHES_RESULT_REMOTE
         )
 
-    async def _add_or_update_node(self, id_, addr):
-        if (id_, addr) in self.routing_table:
-            self._add_node(id_, addr)
-        else:
-            response = await self.remote_ping(addr)
-            if response:
-                self._add_node(response[1]["id"], addr)
-
     # endregion
 
     # region Periodic tasks
     async def _refresh_nodes(self):
-        responses = filter(
-            lambda response: response,
-            await asyncio.gather(
-                *(self.remote_ping(node[1]) for node in self.routing_table.enum_nodes_for_refresh())
-            )
-        )
+        await asyncio.gather(self.refresh_scheduler.refresh(), self.refresh_scheduler6.refresh())
 
-        for addr, data in responses:
-            self._add_node(node_id=data["id"], addr=addr)
+    async def save_snapshot(self):
+        # Routing table is serialized in the event loop, file is written by executor. Write errors are logged,
+        # so periodic saving keeps running
+        if self.snapshot_path is None:
+            return
 
-    def _rotate_salts(self):
-        self.salts.insert(0, calc_sha1(random(128)))
+        data = dumps_snapshot((self.routing_table, self.routing_table6))
+        try:
+            await self.loop.run_in_executor(None, write_file_atomic, self.snapshot_path, data)
+        except OSError:
+            logger.exception("Can't save routing table snapshot into %s", self.snapshot_path)
 
-        if len(self.salts) > 10:
-            self.salts.pop(-1)
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                entries = loads_snapshot(f.read())
+        except (OSError, ValueError):
+            return
+
+        nodes, nodes6 = [], []
+        for id_, addr, last_response in entries:
+            if is_ipv6(addr[0]):
+                self.routing_table6.add(id_, addr, last_response)
+                nodes6.append((id_, addr))
+            else:
+                self.routing_table.add(id_, addr, last_response)
+                nodes.append((id_, addr))
 
-    def _forget_torrents(self):
-        now = datetime.now()
+        self._run_future(self.refresh_scheduler.verify(nodes))
+        self._run_future(self.refresh_scheduler6.verify(nodes6))
 
-        for info_hash, values in list(self.torrents.items()):
-            for value in list(values):
-                if (now - value.added).seconds >= 30 * 60:
-                    values.remove(value)
+    def _rotate_salts(self):
+        self.tokens.rotate()
 
-            if not values:
-                self.torrents.pop(info_hash)
+    def _forget_torrents(self):
+        self.torrents.expire()
 
     # endregion
 
     async def _group_invoke(self, cb, peers):
         return filter(
-            lambda response: response and response[1]["id"] != self.id,
+            lambda response: response and response[1]["id"] not in self.local_ids,
             await asyncio.gather(
                 *(cb(peer) for peer in peers)
             )
         )
 
-    async def _get_values(self, info_hash, announce=False, port=None):
-        result = set()
-        known = set()
-        tokens = set()
-        peers = map(lambda it: it[1], self.routing_table[info_hash])
+    def _lookup(self, target, query, nodes_key="nodes"):
+        return Lookup(
+            target, query, local_ids=self.local_ids, alpha=self.alpha, timeout=self.lookup_timeout,
+            accept=self.verifier.accept, rank=self._rank_node, nodes_key=nodes_key
+        )
 
-        while True:
-            responses = await self._group_invoke(lambda peer: self.remote_get_values(peer, info_hash), peers)
+    def _lookups(self, target, query, addrs=()):
+        # List of (lookup, initial nodes, initial addresses) for every address family, IPv6 one when enabled
+        result = [(self._lookup(target, query), self.routing_table[target], [a for a in addrs if not is_ipv6(a[0])])]
+        if self.ipv6:
+            result.append((
+                self._lookup(target, query, "nodes6"), self.routing_table6[target], [a for a in addrs if is_ipv6(a[0])]
+            ))
 
-            candidates = set()
-            for addr, data in responses:
-                candidates.update(data.get("nodes", []))
-                result.update(data.get("values", []))
+        return result
 
-                token = data.get("token")
-                if token:
-                    tokens.add((addr, token))
+    def _responses(self, kind, lookups):
+        # Responses of lookups of all address families merged in order of arrival
+        started = monotonic()
 
-            closest = RoutingTable.get_k_closest(info_hash, candidates - known, key=lambda it: it[0])
+        async def responses():
+            try:
+                async for response in merge(*(lookup.responses(nodes, addrs) for lookup, nodes, addrs in lookups)):
+                    yield response
+            finally:
+                for lookup, _, _ in lookups:
+                    self._observe_lookup(kind, lookup, started)
 
-            if closest:
-                known.update(candidates)
-                peers = map(lambda it: it[1], closest)
-            else:
-                if announce:
-                    await self._group_invoke(
-                        lambda it: self.remote_announce_peer(
-                            it[0], info_hash, port or 0, it[1], 1 if port is None else 0),
-                        tokens
-                    )
-                    return
-                else:
-                    return result
+        return responses()
 
-    async def bootstrap(self, initial_peers):
-        known = set()
-        peers = initial_peers
+    def _rank_node(self, id_, addr):
+        # Nodes with BEP 42 compliant ids first (when preferred), then faster ones
+        return self.verifier.rank(id_, addr), self.rtt.srtt(addr)
 
-        while True:
-            responses = await self._group_invoke(lambda peer: self.remote_find_node(peer, self.id), peers)
+    def _observe_lookup(self, kind, lookup, started):
+        self.metrics.histogram("dht_lookup_seconds", kind=kind).observe(monotonic() - started)
+        self.metrics.histogram("dht_lookup_rpcs", COUNT_BUCKETS, kind=kind).observe(lookup.rpc_count)
+        self.metrics.histogram("dht_lookup_hops", COUNT_BUCKETS, kind=kind).observe(lookup.hops)
 
-            candidates = set()
-            for addr, data in responses:
-                self._add_node(node_id=data["id"], addr=addr)
-                candidates.update(data["nodes"])
+    def _get_values_lookups(self, info_hash, query=None):
+        return self._lookups(info_hash, query or (lambda peer: self.remote_get_values(peer, info_hash)))
 
-            closest = RoutingTable.get_k_closest(self.id, candidates - known, key=lambda it: it[0])
+    async def _iter_values(self, lookups, max_peers=None):
+        found = set()
+        responses = self._responses("get_peers", lookups)
 
-            if closest:
-                known.update(candidates)
-                peers = map(lambda it: it[1], closest)
-            else:
-                break
+        try:
+            async for addr, data in responses:
+                for peer in data.get("values", []):
+                    if peer not in found:
+                        found.add(peer)
+                        yield peer
+
+                        if max_peers and len(found) >= max_peers:
+                            return
+        finally:
+            await responses.aclose()
+
+    async def _lookup_values(self, info_hash, query=None):
+        # Found peers and (addr, token) of the closest responded nodes, cached by `lookup_cache`
+        lookups = self._get_values_lookups(info_hash, query)
+        peers = frozenset([peer async for peer in self._iter_values(lookups)])
+
+        return peers, tuple(
+            (node[1], data["token"])
+            for lookup, _, _ in lookups for node, data in lookup.closest if data.get("token")
+        )
+
+    async def _get_values(self, info_hash, announce=False, port=None):
+        cached = info_hash in self.lookup_cache
+        peers, closest = await self.lookup_cache.fetch(info_hash, lambda: self._lookup_values(info_hash))
+
+        if announce:
+            announced = list(await self._group_invoke(
+                lambda it: self.remote_announce_peer(
+                    it[0], info_hash, port or 0, it[1], 1 if port is None else 0),
+                closest
+            ))
+
+            if announced:
+                # Cached peers don't include this announce, next lookup must see it
+                self.lookup_cache.invalidate(info_hash)
+            elif cached and closest:
+                # Tokens of the cached nodes are expired or the nodes are gone, look them up again
+                self.lookup_cache.invalidate(info_hash)
+                await self._get_values(info_hash, announce, port)
+        else:
+            return set(peers)
+
+    async def _find_self(self, local_id, addrs=()):
+        lookups = self._lookups(local_id, lambda peer: self.remote_find_node(peer, local_id), addrs)
+
+        async for addr, data in self._responses("bootstrap", lookups):
+            self._add_node(node_id=data["id"], addr=addr)
+
+    async def bootstrap(self, initial_peers):
+        await self._find_self(self.id, addrs=initial_peers)
 
     async def announce(self, info_hash, port=None):
         await self._get_values(decode_info_hash(info_hash), announce=True, port=port)
 
+    async def get_peers_many(self, info_hashes, concurrency=64):
+        pool = QueryPool(self.remote_get_values, concurrency)
+        lookups = asyncio.Semaphore(max(1, concurrency // self.alpha))
+
+        async def get_values(info_hash):
+            async with lookups:
+                target = decode_info_hash(info_hash)
+                peers, _ = await self.lookup_cache.fetch(
+                    target, lambda: self._lookup_values(target, lambda peer: pool.query(peer, target))
+                )
+                return info_hash, set(peers)
+
+        tasks = [asyncio.ensure_future(get_values(info_hash)) for info_hash in dict.fromkeys(info_hashes)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def iter_peers(self, info_hash, max_peers=None):
+        return self._iter_values(self._get_values_lookups(decode_info_hash(info_hash)), max_peers)
+
     def __getitem__(self, item):
         return self._get_values(decode_info_hash(item))
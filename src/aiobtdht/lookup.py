@@ -0,0 +1,309 @@
+import asyncio
+from bisect import insort
+from collections import OrderedDict
+from time import monotonic
+
+_QUERIED = 1
+_RESPONDED = 2
+
+
+class Lookup:
+    # Iterative Kademlia lookup. Known nodes are kept in a shortlist ordered by distance to `target`,
+    # up to `alpha` requests are in flight and a slot is refilled as soon as any response arrives.
+    # The lookup is over when `k` closest alive nodes have responded or `timeout` is expired.
+    # Nodes rejected by `accept` are never queried, unqueried nodes at the same log-distance are queried
+    # in order of `rank` (e.g. expected latency).
+    def __init__(self, target, query, local_ids=(), alpha=3, k=8, timeout=None, accept=None, rank=None,
+                 nodes_key="nodes"):
+        self._target = target
+        self._query = query  # Coroutine function `query(addr)`, result is `(addr, data)` or `None`
+        self._local_ids = local_ids  # Ids of this node, such nodes are never queried
+        self._alpha = alpha
+        self._k = k
+        self._timeout = timeout
+        self._accept = accept  # Function `accept(id, addr)`, result is bool
+        self._rank = rank  # Function `rank(id, addr)`, result is sort key, lower is queried first
+        self._nodes_key = nodes_key  # `nodes6` for IPv6 lookups
+
+        self._shortlist = []  # [(distance, id, addr), ...]
+        self._state = {}  # (id, addr) -> state
+        self._hops = {}  # (id, addr) -> number of hops from the initial nodes
+        self._data = {}  # (id, addr) -> response data
+
+        self._rpc_count = 0
+        self._max_hops = 0
+
+    # region Internal methods
+    def _add(self, nodes, hops):
+        for id_, addr in nodes:
+            key = (id_, addr)
+            if key not in self._state and id_ not in self._local_ids and (
+                    self._accept is None or self._accept(id_, addr)):
+                self._state[key] = 0
+                self._hops[key] = hops
+                insort(self._shortlist, (id_ ^ self._target, id_, addr))
+
+    def _next(self, in_flight):
+        # Unqueried nodes among `k` closest alive ones, `None` when all of them have responded
+        candidates = []
+        finished = bool(self._shortlist)  # Empty shortlist may be filled by responses of initial addresses
+
+        for distance, id_, addr in self._shortlist[:self._k]:
+            state = self._state[(id_, addr)]
+            if state != _RESPONDED:
+                finished = False
+
+            if not state:
+                candidates.append((distance, id_, addr))
+
+        if self._rank is not None:
+            candidates.sort(key=lambda it: (it[0].bit_length(), self._rank(it[1], it[2])))
+
+        return None if finished else [(id_, addr) for _, id_, addr in candidates[:max(0, self._alpha - in_flight)]]
+
+    def _fail(self, key):
+        if self._state[key] != _RESPONDED:
+            id_, addr = key
+            self._shortlist.remove((id_ ^ self._target, id_, addr))
+
+    def _respond(self, key, response, hops):
+        addr, data = response
+
+        if key[0] is None:
+            # Initial node known by address only
+            key = (data["id"], addr)
+            if key not in self._state:
+                insort(self._shortlist, (key[0] ^ self._target, key[0], addr))
+
+        self._state[key] = _RESPONDED
+        self._data[key] = data
+        self._max_hops = max(self._max_hops, hops)
+        self._add(data.get(self._nodes_key, ()), hops + 1)
+
+    # endregion
+
+    async def responses(self, nodes=(), addrs=()):
+        # Nodes -- list of (node_id, addr) to start from, `addrs` -- list of addresses with unknown id
+        # (e.g. bootstrap routers). Yield `(addr, data)` for each response as it arrives.
+        deadline = monotonic() + self._timeout if self._timeout else None
+        pending = {}
+
+        def start(key, hops):
+            self._rpc_count += 1
+            pending[asyncio.ensure_future(self._query(key[1]))] = (key, hops)
+
+        self._add(nodes, 0)
+        for addr in addrs:
+            start((None, addr), 0)
+
+        try:
+            while True:
+                candidates = self._next(len(pending))
+                if candidates is None:
+                    break
+
+                for key in candidates:
+                    self._state[key] = _QUERIED
+                    start(key, self._hops[key])
+
+                if not pending:
+                    break
+
+                timeout = deadline - monotonic() if deadline else None
+                if timeout is not None and timeout <= 0:
+                    break
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+
+                for task in done:
+                    key, hops = pending.pop(task)
+                    response = None if task.cancelled() or task.exception() else task.result()
+
+                    if response and response[1]["id"] not in self._local_ids:
+                        self._respond(key, response, hops)
+                        yield response
+                    elif key[0] is not None:
+                        self._fail(key)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def run(self, nodes=(), addrs=()):
+        async for _ in self.responses(nodes, addrs):
+            pass
+
+        return self.closest
+
+    @property
+    def closest(self):
+        # List of ((node_id, addr), data) for `k` closest responded nodes
+        return [
+            ((id_, addr), self._data[(id_, addr)])
+            for _, id_, addr in self._shortlist
+            if self._state[(id_, addr)] == _RESPONDED
+        ][:self._k]
+
+    @property
+    def rpc_count(self):
+        return self._rpc_count
+
+    @property
+    def hops(self):
+        return self._max_hops
+
+
+class QueryPool:
+    # Shares requests between concurrent lookups: bounds the number of requests in flight, merges
+    # identical requests to the same node and caches `nodes` of recent responses by node and target
+    # prefix. Only responses of nodes outside of the prefix are cached, such nodes are too far away to
+    # store values for any target with the same prefix and return the same `nodes`.
+    def __init__(self, query, concurrency=64, prefix_bits=16, cache_ttl=30, max_cache_size=65536):
+        self._query = query  # Coroutine function `query(addr, target)`, result is `(addr, data)` or `None`
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._shift = 160 - prefix_bits
+        self._cache_ttl = cache_ttl
+        self._max_cache_size = max_cache_size
+
+        self._in_flight = {}  # (addr, target) -> future
+        self._cache = OrderedDict()  # (addr, target prefix) -> (expiration time, response)
+
+        self._cache_hits = 0
+        self._merged = 0
+
+    async def _request(self, addr, target):
+        async with self._semaphore:
+            response = await self._query(addr, target)
+
+        if response:
+            data = response[1]
+            if not data.get("values") and (data["id"] ^ target) >> self._shift:
+                self._cache[(addr, target >> self._shift)] = (
+                    monotonic() + self._cache_ttl, (addr, {
+                        "id": data["id"], "nodes": data.get("nodes", []), "nodes6": data.get("nodes6", [])
+                    })
+                )
+
+                if len(self._cache) > self._max_cache_size:
+                    self._cache.popitem(last=False)
+
+        return response
+
+    async def query(self, addr, target):
+        cache_key = (addr, target >> self._shift)
+        cached = self._cache.get(cache_key)
+        if cached:
+            if cached[0] > monotonic():
+                self._cache_hits += 1
+                return cached[1]
+            else:
+                self._cache.pop(cache_key)
+
+        key = (addr, target)
+        fut = self._in_flight.get(key)
+        if fut is None:
+            fut = self._in_flight[key] = asyncio.ensure_future(self._request(addr, target))
+            fut.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self._merged += 1
+
+        # Shield shared request from cancellation of a single lookup
+        return await asyncio.shield(fut)
+
+    @property
+    def cache_hits(self):
+        return self._cache_hits
+
+    @property
+    def merged(self):
+        return self._merged
+
+
+class LookupCache:
+    # Read-through cache of `get_peers` lookup results by `info_hash`: concurrent requests of the same
+    # `info_hash` share one lookup, results are kept for `ttl` seconds. An entry holds found peers and
+    # (addr, token) of the closest responded nodes, so an announce may skip the traversal. The least
+    # recently used entries are evicted beyond `max_size` entries or `max_items` peers and nodes in total.
+    def __init__(self, ttl=60, max_size=1024, max_items=100000):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._max_items = max_items
+
+        self._in_flight = {}  # info_hash -> future
+        self._cache = OrderedDict()  # info_hash -> (expiration time, peers, closest), from least recently used
+        self._items = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._merged = 0
+
+    def _pop(self, info_hash):
+        _, peers, closest = self._cache.pop(info_hash)
+        self._items -= len(peers) + len(closest)
+
+    def _put(self, info_hash, fut):
+        if fut.cancelled() or fut.exception() or self._ttl <= 0:
+            return
+
+        peers, closest = fut.result()
+        if info_hash in self._cache:
+            self._pop(info_hash)
+
+        self._cache[info_hash] = (monotonic() + self._ttl, peers, closest)
+        self._items += len(peers) + len(closest)
+
+        while self._cache and (len(self._cache) > self._max_size or self._items > self._max_items):
+            self._pop(next(iter(self._cache)))
+
+    def _get(self, info_hash):
+        cached = self._cache.get(info_hash)
+        if cached:
+            if cached[0] > monotonic():
+                self._cache.move_to_end(info_hash)
+                return cached[1:]
+            else:
+                self._pop(info_hash)
+
+        return None
+
+    async def fetch(self, info_hash, lookup):
+        # Lookup -- coroutine function `lookup()`, result is (peers, [(addr, token), ...]) and is cached as is
+        cached = self._get(info_hash)
+        if cached:
+            self._hits += 1
+            return cached
+
+        fut = self._in_flight.get(info_hash)
+        if fut is None:
+            self._misses += 1
+            fut = self._in_flight[info_hash] = asyncio.ensure_future(lookup())
+            fut.add_done_callback(lambda _: self._in_flight.pop(info_hash, None))
+            fut.add_done_callback(lambda _: self._put(info_hash, fut))
+        else:
+            self._merged += 1
+
+        # Shield shared lookup from cancellation of a single caller
+        return await asyncio.shield(fut)
+
+    def invalidate(self, info_hash):
+        if info_hash in self._cache:
+            self._pop(info_hash)
+
+    def __contains__(self, info_hash):
+        return self._get(info_hash) is not None
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def hits(self):
+        return self._hits
+
+    @property
+    def misses(self):
+        return self._misses
+
+    @property
+    def merged(self):
+        return self._merged
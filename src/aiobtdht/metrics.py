@@ -0,0 +1,157 @@
+from bisect import bisect_left
+from itertools import accumulate
+
+# Upper bounds of histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, value=1):
+        self.value += value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last one is `+Inf` bucket
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _NullMetric:
+    # Returned by disabled registry, so instrumented code doesn't need to check anything
+    __slots__ = ()
+
+    def inc(self, value=1):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+_NULL_METRIC = _NullMetric()
+
+
+def _format_labels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}" if labels else ""
+
+
+class Metrics:
+    # Registry of counters and histograms identified by name and labels. Values which are maintained
+    # elsewhere anyway (table size, peer store counters, ...) are registered as collectors and are read
+    # on snapshot only. Callbacks are timed when `profile` is set.
+    def __init__(self, enabled=True, profile=False):
+        self._enabled = enabled
+        self._profile = enabled and profile
+
+        self._metrics = {}  # (name, labels) -> Counter or Histogram
+        self._collectors = {}  # name -> (type, function)
+
+    def counter(self, name, **labels):
+        if not self._enabled:
+            return _NULL_METRIC
+
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = Counter()
+
+        return metric
+
+    def histogram(self, name, bounds=LATENCY_BUCKETS, **labels):
+        if not self._enabled:
+            return _NULL_METRIC
+
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = self._metrics[key] = Histogram(bounds)
+
+        return metric
+
+    def collect(self, name, f, type_="gauge"):
+        # F -- function without arguments, result is a number or dict {labels tuple: number}
+        if self._enabled:
+            self._collectors[name] = (type_, f)
+
+    # region Export
+    def _collected(self):
+        for name, (type_, f) in self._collectors.items():
+            value = f()
+            if isinstance(value, dict):
+                for labels, item in value.items():
+                    yield name, type_, labels, item
+            else:
+                yield name, type_, (), value
+
+    def snapshot(self):
+        # Result -- dict {`name{labels}`: value}, histogram value is dict with `count`, `sum` and
+        # cumulative `buckets`
+        result = {}
+
+        for (name, labels), metric in self._metrics.items():
+            key = name + _format_labels(labels)
+            if isinstance(metric, Histogram):
+                result[key] = {
+                    "count": metric.count,
+                    "sum": metric.sum,
+                    "buckets": dict(zip(metric.bounds + (float("inf"),), accumulate(metric.counts)))
+                }
+            else:
+                result[key] = metric.value
+
+        for name, _, labels, value in self._collected():
+            result[name + _format_labels(labels)] = value
+
+        return result
+
+    def to_prometheus(self):
+        lines = []
+        typed = set()
+
+        def add_type(name, type_):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {type_}")
+
+        for (name, labels), metric in sorted(self._metrics.items(), key=lambda it: it[0]):
+            if isinstance(metric, Histogram):
+                add_type(name, "histogram")
+                for bound, count in zip(metric.bounds + ("+Inf",), accumulate(metric.counts)):
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+
+                lines.append(f"{name}_sum{_format_labels(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {metric.count}")
+            else:
+                add_type(name, "counter")
+                lines.append(f"{name}{_format_labels(labels)} {metric.value}")
+
+        for name, type_, labels, value in self._collected():
+            add_type(name, type_)
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+    # endregion
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @property
+    def profile(self):
+        return self._profile
+
@@ -0,0 +1,59 @@
+import asyncio
+from bisect import bisect_left
+
+from .dht import DHT
+
+
+def closest_id(ids, target):
+    # XOR-closest id of sorted `ids`: walk down the bits of `target`, narrowing the range of ids which share
+    # the prefix with it, and take the other half only when there are no ids with the same bit
+    lo, hi = 0, len(ids)
+    prefix = 0
+
+    for bit in range(159, -1, -1):
+        if hi - lo <= 1:
+            break
+
+        mask = 1 << bit
+        mid = bisect_left(ids, prefix | mask, lo, hi)
+        if target & mask:
+            if mid < hi:
+                lo, prefix = mid, prefix | mask
+            else:
+                hi = mid
+        elif mid > lo:
+            hi = mid
+        else:
+            prefix |= mask
+
+    return ids[lo]
+
+
+class MultiDHT(DHT):
+    # Several node ids served on one transport. Routing table, peer store, token secrets, contact verification
+    # and periodic tasks are shared by all ids, so an additional id costs one list item. Queries are answered
+    # and sent on behalf of the id closest to their target, other nodes see every id as a separate node.
+    def __init__(self, local_ids, server, loop, **kwargs):
+        ids = sorted(set(local_ids))
+        if not ids:
+            raise ValueError("At least one id is required")
+
+        super().__init__(ids[0], server, loop, **kwargs)
+
+        self.ids = ids
+        self.local_ids = frozenset(ids)
+
+    def _local_id(self, target=None):
+        return self.id if target is None else closest_id(self.ids, target)
+
+    async def bootstrap(self, initial_peers, concurrency=16):
+        await super().bootstrap(initial_peers)
+
+        # Introduce other ids to their neighbourhoods
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def find_self(local_id):
+            async with semaphore:
+                await self._find_self(local_id)
+
+        await asyncio.gather(*(find_self(local_id) for local_id in self.ids if local_id != self.id))
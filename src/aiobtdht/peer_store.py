@@ -0,0 +1,170 @@
+from random import sample
+from random import randrange
+from time import monotonic
+
+
+class PeerStore:
+    # Announced peers grouped by `info_hash`. Every entry is also registered in a timing wheel slot
+    # of `resolution` seconds holding its expiration time, so `expire` touches expired entries only.
+    # Store size is bounded globally, per `info_hash` and per announcing IP; when full the least
+    # recently announced peers are evicted.
+    def __init__(self, ttl=30 * 60, resolution=60, max_peers=100000, max_peers_per_torrent=500,
+                 max_peers_per_ip=100, max_values=50):
+        self._ttl = ttl
+        self._resolution = resolution
+        self._max_peers = max_peers
+        self._max_peers_per_torrent = max_peers_per_torrent
+        self._max_peers_per_ip = max_peers_per_ip
+        self._max_values = max_values
+
+        self._torrents = {}  # info_hash -> {(host, port): slot}, ordered from least recently announced
+        self._info_hashes = []  # Keys of `_torrents` in array form for random sampling
+        self._positions = {}  # info_hash -> index in `_info_hashes`
+        self._wheel = {}  # slot -> {(info_hash, (host, port)), ...}
+        self._expired_slot = self._slot(monotonic())  # Every slot before this one is already expired
+        self._ips = {}  # host -> number of stored peers announced from it
+        self._size = 0
+
+        self._evictions = 0
+        self._rejected = 0
+
+    # region Internal methods
+    def _slot(self, timestamp):
+        return int(timestamp // self._resolution)
+
+    def _unlink(self, info_hash, peer, slot):
+        entries = self._wheel.get(slot)
+        if entries is not None:
+            entries.discard((info_hash, peer))
+            if not entries:
+                self._wheel.pop(slot)
+
+    def _discard(self, info_hash, peer):
+        peers = self._torrents[info_hash]
+        peers.pop(peer)
+        if not peers:
+            self._torrents.pop(info_hash)
+
+            # Swap with the last info_hash and pop, so removal is O(1)
+            index = self._positions.pop(info_hash)
+            last = self._info_hashes.pop()
+            if last != info_hash:
+                self._info_hashes[index] = last
+                self._positions[last] = index
+
+        host = peer[0]
+        if self._ips[host] > 1:
+            self._ips[host] -= 1
+        else:
+            self._ips.pop(host)
+
+        self._size -= 1
+
+    def _evict(self, info_hash=None):
+        if info_hash is None:
+            # Oldest entries live in the earliest non-empty slot of the wheel
+            slot = min(self._wheel)
+            info_hash, peer = next(iter(self._wheel[slot]))
+        else:
+            peer = next(iter(self._torrents[info_hash]))
+            slot = self._torrents[info_hash][peer]
+
+        self._unlink(info_hash, peer, slot)
+        self._discard(info_hash, peer)
+        self._evictions += 1
+
+    # endregion
+
+    def add(self, info_hash, peer, now=None):
+        # Peer -- tuple (host, port), announcing the same peer again refreshes its expiration time
+        slot = self._slot((monotonic() if now is None else now) + self._ttl)
+        peers = self._torrents.get(info_hash, {})
+
+        old_slot = peers.pop(peer, None)
+        if old_slot is None:
+            if self._ips.get(peer[0], 0) >= self._max_peers_per_ip:
+                self._rejected += 1
+                return False
+
+            if len(peers) >= self._max_peers_per_torrent:
+                self._evict(info_hash)
+            elif self._size >= self._max_peers:
+                self._evict()
+
+            self._ips[peer[0]] = self._ips.get(peer[0], 0) + 1
+            self._size += 1
+        else:
+            self._unlink(info_hash, peer, old_slot)
+
+        if info_hash not in self._torrents:
+            self._torrents[info_hash] = peers
+            self._positions[info_hash] = len(self._info_hashes)
+            self._info_hashes.append(info_hash)
+
+        peers[peer] = slot
+        self._wheel.setdefault(slot, set()).add((info_hash, peer))
+        return True
+
+    def remove(self, info_hash, peer):
+        peers = self._torrents.get(info_hash)
+        if peers is None or peer not in peers:
+            return False
+
+        self._unlink(info_hash, peer, peers[peer])
+        self._discard(info_hash, peer)
+        return True
+
+    def expire(self, now=None):
+        current_slot = self._slot(monotonic() if now is None else now)
+        expired = 0
+
+        for slot in range(self._expired_slot, current_slot):
+            for info_hash, peer in self._wheel.pop(slot, ()):
+                self._discard(info_hash, peer)
+                expired += 1
+
+        self._expired_slot = max(self._expired_slot, current_slot)
+
+        return expired
+
+    def get(self, info_hash):
+        return list(self._torrents.get(info_hash, ()))
+
+    def sample(self, info_hash):
+        # At most `max_values` random peers, so `get_peers` response fits into one datagram
+        peers = self.get(info_hash)
+        return sample(peers, self._max_values) if len(peers) > self._max_values else peers
+
+    def sample_info_hashes(self, count=20):
+        # At most `count` distinct random info_hashes, without copying of the whole key set
+        info_hashes = self._info_hashes
+        if len(info_hashes) <= count:
+            return list(info_hashes)
+
+        picked = set()
+        while len(picked) < count:
+            picked.add(randrange(len(info_hashes)))
+
+        return [info_hashes[index] for index in picked]
+
+    @property
+    def size(self):
+        # Total number of stored peers
+        return self._size
+
+    @property
+    def evictions(self):
+        return self._evictions
+
+    @property
+    def rejected(self):
+        return self._rejected
+
+    def __len__(self):
+        return len(self._torrents)
+
+    def __contains__(self, info_hash):
+        return info_hash in self._torrents
+
+    def __iter__(self):
+        return iter(self._torrents)
@@ -0,0 +1,103 @@
+import asyncio
+from random import randrange
+from random import shuffle
+
+from .utils import RateLimiter
+
+
+class RefreshScheduler:
+    # Refresh pass spreads its requests evenly over `interval` with a token bucket instead of sending
+    # them at once. Questionable nodes are pinged and dropped after `max_failures` missed pings, buckets
+    # without changes for `stale_age` seconds are refreshed with `find_node` for a random id in bucket
+    # range (BEP 5), returned nodes are passed to admission.
+    def __init__(self, routing_table, ping, find_node, admit, interval=60, stale_age=15 * 60, max_failures=3,
+                 max_rate=100, nodes_key="nodes"):
+        self._routing_table = routing_table
+        self._ping = ping  # Coroutine function `ping(addr)`
+        self._find_node = find_node  # Coroutine function `find_node(addr, target_id)`
+        self._admit = admit  # Function `admit(id, addr)`
+        self._interval = interval
+        self._stale_age = stale_age
+        self._max_failures = max_failures
+        self._max_rate = max_rate
+        self._nodes_key = nodes_key  # `nodes6` for IPv6 routing table
+
+        self._pings = 0
+        self._bucket_refreshes = 0
+        self._dropped = 0
+
+    async def _ping_node(self, node):
+        id_, addr = node
+        response = await self._ping(addr)
+        self._pings += 1
+
+        if response and response[1]["id"] == id_:
+            self._routing_table.add(id_, addr)
+        elif self._routing_table.fail(id_, addr, self._max_failures):
+            self._dropped += 1
+
+    async def _refresh_bucket(self, bucket_range):
+        target_id = randrange(*bucket_range)
+        self._bucket_refreshes += 1
+
+        nodes = self._routing_table[(target_id, 1)]
+        if nodes:
+            # Nodes found by the query usually belong to other buckets, so the bucket is marked as refreshed
+            # once the query is sent (BEP 5), otherwise empty ranges are refreshed again on every pass
+            self._routing_table.touch(target_id)
+
+        for id_, addr in nodes:
+            response = await self._find_node(addr, target_id)
+            if response:
+                self._routing_table.add(id_, addr)
+
+                for node_id, node_addr in response[1].get(self._nodes_key, ()):
+                    self._admit(node_id, node_addr)
+            else:
+                self._routing_table.fail(id_, addr, self._max_failures)
+
+    async def _run(self, jobs, rate):
+        limiter = RateLimiter(rate, burst=1)
+        tasks = set()
+
+        try:
+            for job, arg in jobs:
+                await limiter.acquire()
+
+                task = asyncio.ensure_future(job(arg))
+                task.add_done_callback(tasks.discard)
+                tasks.add(task)
+
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def refresh(self):
+        jobs = [
+            *((self._ping_node, node) for node in self._routing_table.enum_questionable_nodes()),
+            *((self._refresh_bucket, r) for r in self._routing_table.enum_stale_buckets(self._stale_age))
+        ]
+
+        if jobs:
+            await self._run(jobs, min(self._max_rate, len(jobs) / self._interval))
+
+    async def verify(self, nodes):
+        # Ping nodes at full rate, e.g. nodes loaded from snapshot
+        nodes = list(nodes)
+        shuffle(nodes)  # Spread verified nodes over buckets
+
+        await self._run([(self._ping_node, node) for node in nodes], self._max_rate)
+
+    @property
+    def pings(self):
+        return self._pings
+
+    @property
+    def bucket_refreshes(self):
+        return self._bucket_refreshes
+
+    @property
+    def dropped(self):
+        return self._dropped
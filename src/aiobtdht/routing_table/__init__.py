@@ -1,57 +1,209 @@
+from bisect import bisect_right
+from heapq import nsmallest
+from struct import Struct
+from time import monotonic
+from time import time
+
 from .bucket import Bucket
+from .compact_bucket import CompactBucket
 from .node import Node
+from .node_stat import NodeStat
+from ..security import subnet
+from ..utils import decode_nodes
+from ..utils import decode_nodes6
+from ..utils import encode_nodes
+from ..utils import encode_nodes6
+from ..utils import is_ipv6
+
+_ID_SPACE = 2 ** 160
+
+# Snapshot: magic, format version and numbers of IPv4 and IPv6 nodes, then IPv4 and IPv6 nodes in compact
+# node info format (26 and 38 bytes each) followed by unix times of their last responses (4 bytes each).
+# Version 1 has IPv4 nodes only and no IPv6 number in the header.
+_SNAPSHOT_HEADER = Struct("!4sBII")
+_SNAPSHOT_HEADER_V1 = Struct("!4sBI")
+_SNAPSHOT_MAGIC = b"BTRT"
+_SNAPSHOT_VERSION = 2
+
+
+def dumps_snapshot(tables):
+    nodes, nodes6, times, times6 = [], [], [], []
+    offset = time() - monotonic()  # Monotonic clock to unix time
+
+    for table in tables:
+        for bucket in table._buckets:
+            for node, stat in bucket._enum_nodes():
+                ipv6 = is_ipv6(node.addr[0])
+                (nodes6 if ipv6 else nodes).append((node.id, node.addr))
+                (times6 if ipv6 else times).append(max(0, int(stat.last_response + offset)))
+
+    times += times6
+    return b"".join((
+        _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, _SNAPSHOT_VERSION, len(nodes), len(nodes6)),
+        encode_nodes(nodes),
+        encode_nodes6(nodes6),
+        Struct(f"!{len(times)}I").pack(*times)
+    ))
+
+
+def loads_snapshot(data):
+    # Result -- list of (node_id, addr, last response time by monotonic clock)
+    if len(data) < _SNAPSHOT_HEADER_V1.size:
+        raise ValueError("Wrong length")
+
+    magic, version, count = _SNAPSHOT_HEADER_V1.unpack_from(data)
+    if magic != _SNAPSHOT_MAGIC or version not in (1, _SNAPSHOT_VERSION):
+        raise ValueError("Unsupported snapshot format")
+
+    if version == 1:
+        nodes_start, count6 = _SNAPSHOT_HEADER_V1.size, 0
+    elif len(data) < _SNAPSHOT_HEADER.size:
+        raise ValueError("Wrong length")
+    else:
+        nodes_start, count6 = _SNAPSHOT_HEADER.size, _SNAPSHOT_HEADER.unpack_from(data)[3]
+
+    nodes6_start = nodes_start + count * 26
+    nodes_end = nodes6_start + count6 * 38
+    if len(data) != nodes_end + (count + count6) * 4:
+        raise ValueError("Wrong length")
+
+    nodes = decode_nodes(data[nodes_start:nodes6_start]) + decode_nodes6(data[nodes6_start:nodes_end])
+    times = Struct(f"!{count + count6}I").unpack_from(data, nodes_end)
+    offset = monotonic() - time()  # Unix time to monotonic clock
+
+    return [(id_, addr, last_response + offset) for (id_, addr), last_response in zip(nodes, times)]
 
 
 class RoutingTable:
-    def __init__(self, local_id):
+    def __init__(self, local_id, compact=False, max_nodes_per_subnet=None):
         self._local_id = local_id
-        self._buckets = {Bucket(0, 2 ** 160)}
+        self._max_nodes_per_subnet = max_nodes_per_subnet  # Per bucket, subnets are /24 (IPv4) and /64 (IPv6)
+        # Buckets are kept sorted by `range_min` and cover [0..2^160) without gaps,
+        # `_bounds` mirrors their lower bounds for bisection
+        self._buckets = [(CompactBucket if compact else Bucket)(0, _ID_SPACE)]
+        self._bounds = [0]
+
+    def add(self, id_, addr, last_response=None):
+        index = self._bucket_index(id_)
+        bucket = self._buckets[index]
+        if self._max_nodes_per_subnet and self._is_subnet_full(bucket, id_, addr):
+            return
 
-    def add(self, id_, addr):
-        for bucket in self._buckets:
-            if bucket.id_in_range(id_):
-                added = bucket.add(Node(id_, addr))
+        added = bucket.add(Node(id_, addr), None if last_response is None else NodeStat(last_response))
 
-                if not added and self._split(bucket):
-                    return self.add(id_, addr)
+        if not added and self._split(index):
+            return self.add(id_, addr, last_response)
 
     # region Internal methods
-    def _split(self, bucket):
-        if bucket.range_max - bucket.range_min < bucket.max_capacity:
+    def _bucket_index(self, id_):
+        return bisect_right(self._bounds, id_) - 1
+
+    def _bucket_slice(self, range_min, range_max):
+        return self._buckets[self._bucket_index(range_min):self._bucket_index(range_max - 1) + 1]
+
+    def _is_subnet_full(self, bucket, id_, addr):
+        # Nodes already in the bucket are renewed regardless of the limit, local addresses are not limited
+        net = subnet(addr[0])
+        if net is None:
             return False
 
-        self._buckets.remove(bucket)
+        count = 0
+        for node, _ in bucket._enum_nodes():
+            if node.id == id_ and node.addr == addr:
+                return False
+
+            if subnet(node.addr[0]) == net:
+                count += 1
+
+        return count >= self._max_nodes_per_subnet
+
+    def _split(self, index):
+        bucket = self._buckets[index]
 
-        median = (bucket.range_max + bucket.range_min) >> 1  # Divide by half
+        if not bucket.can_split:
+            return False
+
+        new_buckets = bucket.split()
 
-        for new_bucket in (Bucket(bucket.range_min, median), Bucket(median, bucket.range_max)):
-            self._buckets.add(new_bucket)
-            for node in bucket.nodes:
-                if new_bucket.id_in_range(node.id):
-                    new_bucket.add(node)
+        self._buckets[index:index + 1] = new_buckets
+        self._bounds[index:index + 1] = (new_bucket.range_min for new_bucket in new_buckets)
 
         return True
 
     def _get_closest(self, target_id, k=8):
+        # Bucket ranges are aligned halves of the id space, so every node in a subtree is closer to
+        # the target than any node outside of it. Walk up from the target's bucket and visit sibling
+        # subtrees until `k` nodes are collected.
+        bucket = self._buckets[self._bucket_index(target_id)]
+        range_min, range_max = bucket.range_min, bucket.range_max
+        result = self._closest_in((bucket,), target_id, k)
+
+        while len(result) < k and range_max - range_min < _ID_SPACE:
+            size = range_max - range_min
+            parent_min = range_min & ~(2 * size - 1)
+            sibling_min = range_min + size if parent_min == range_min else parent_min
+
+            result.extend(
+                self._closest_in(self._bucket_slice(sibling_min, sibling_min + size), target_id, k - len(result))
+            )
+
+            range_min, range_max = parent_min, parent_min + 2 * size
+
+        return result
+
+    def _closest_in(self, buckets, target_id, k):
         return self.get_k_closest(
             target_id,
-            ((node.id, node.addr) for bucket in self._buckets for node in bucket.nodes),
+            ((node.id, node.addr) for bucket in buckets for node in bucket.nodes),
             key=lambda it: it[0],
             k=k
         )
 
     # endregion
 
+    def fail(self, id_, addr, max_failures=3):
+        # Register missed response, result is `True` when the node is removed
+        return self._buckets[self._bucket_index(id_)].fail(Node(id_, addr), max_failures)
+
     def enum_nodes_for_refresh(self):
         for b in self._buckets:
             yield from b.enum_nodes_for_refresh()
 
+    def enum_questionable_nodes(self):
+        for b in self._buckets:
+            yield from b.enum_questionable_nodes()
+
+    def touch(self, id_):
+        # Mark bucket of `id_` as refreshed
+        self._buckets[self._bucket_index(id_)].touch()
+
+    def enum_stale_buckets(self, age):
+        # Ranges (range_min, range_max) of buckets without changes for `age` seconds
+        changed_after = monotonic() - age
+        for b in self._buckets:
+            if b.last_changed < changed_after:
+                yield b.range_min, b.range_max
+
+    def bucket_sizes(self):
+        return [len(bucket) for bucket in self._buckets]
+
+    def dumps(self):
+        return dumps_snapshot((self,))
+
+    def loads(self, data):
+        # Add nodes of snapshot keeping their last response times, result is the list of loaded nodes
+        entries = loads_snapshot(data)
+        for id_, addr, last_response in entries:
+            self.add(id_, addr, last_response)
+
+        return [(id_, addr) for id_, addr, _ in entries]
+
     @staticmethod
     def get_k_closest(target, iterable, key=None, k=8):
         if key and not callable(key):
             raise
 
-        return sorted(iterable, key=lambda n: (key(n) if key else n) ^ target)[:k]
+        return nsmallest(k, iterable, key=lambda n: (key(n) if key else n) ^ target)
 
     def __getitem__(self, item):
         # Item -- node_id or tuple (node_id, k), by default `k == 8`
@@ -62,5 +214,13 @@ class RoutingTable:
         else:
             raise TypeError("Unsupported type")
 
+    def __len__(self):
+        return sum(self.bucket_sizes())
+
     def __contains__(self, item):
-        return any(item in bucket for bucket in self._buckets)
+        if isinstance(item, int):
+            return item in self._buckets[self._bucket_index(item)]
+        elif isinstance(item, tuple):
+            return item in self._buckets[self._bucket_index(item[0])]
+        else:
+            raise TypeError("Unsupported type")
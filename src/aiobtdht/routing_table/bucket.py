@@ -1,12 +1,17 @@
+from time import monotonic
+
 from .node_stat import NodeStat
 
 
 class Bucket:
-    def __init__(self, range_min, range_max, max_capacity=8):
+    __slots__ = ("_range_min", "_range_max", "_max_capacity", "_nodes", "_last_changed")
+
+    def __init__(self, range_min, range_max, max_capacity=8, last_changed=None):
         self._range_min = range_min
         self._range_max = range_max
         self._max_capacity = max_capacity
         self._nodes = {}
+        self._last_changed = monotonic() if last_changed is None else last_changed
 
     def __hash__(self):
         return hash((self._range_min, self._range_max))
@@ -14,33 +19,87 @@ class Bucket:
     def id_in_range(self, id_):
         return self._range_min <= id_ < self._range_max
 
-    def add(self, node):
+    def touch(self):
+        # Mark as changed, e.g. when a refresh lookup of the bucket range is sent
+        self._last_changed = monotonic()
+
+    def add(self, node, stat=None):
         if not self.id_in_range(node.id):
             raise IndexError("Node id not in bucket range")
 
-        if node in self._nodes:
-            self._nodes[node].renew()
+        if self._renew(node):
+            self._last_changed = monotonic()
             return True
-        elif len(self._nodes) < self._max_capacity:
-            self._nodes[node] = NodeStat()
+        elif len(self) < self._max_capacity:
+            self._insert(node, stat or NodeStat())
+            self._last_changed = monotonic()
             return True
         else:
-            can_delete = list(filter(lambda it: it[1].rate < 0, self._enum_nodes()))
+            can_delete = [it for it, stat in self._enum_nodes() if stat.rate < 0]
             if can_delete:
                 for it in can_delete:
-                    self._nodes.pop(it)
+                    self._remove(it)
 
-                return self.add(node)
+                return self.add(node, stat)
             else:
                 return False
 
+    def fail(self, node, max_failures):
+        # Count missed response, node is removed after `max_failures` consecutive misses
+        failures = self._fail(node)
+        if failures is not None and failures >= max_failures:
+            self._remove(node)
+            return True
+
+        return False
+
+    def is_full(self):
+        # No free room and no bad nodes to replace
+        return len(self) >= self._max_capacity and all(stat.rate >= 0 for _, stat in self._enum_nodes())
+
+    def split(self):
+        median = (self._range_max + self._range_min) >> 1  # Divide by half
+
+        result = (
+            type(self)(self._range_min, median, self._max_capacity, self._last_changed),
+            type(self)(median, self._range_max, self._max_capacity, self._last_changed)
+        )
+
+        for node, stat in self._enum_nodes():
+            result[node.id >= median]._insert(node, stat)
+
+        return result
+
+    # region Storage
+    def _renew(self, node):
+        stat = self._nodes.get(node)
+        if stat is None:
+            return False
+
+        stat.renew()
+        return True
+
+    def _fail(self, node):
+        stat = self._nodes.get(node)
+        return None if stat is None else stat.fail()
+
+    def _insert(self, node, stat):
+        self._nodes[node] = stat
+
+    def _remove(self, node):
+        self._nodes.pop(node, None)
+
     def _enum_nodes(self):
-        for node, stat in self._nodes.items():
-            yield node, stat
+        yield from self._nodes.items()
+
+    # endregion
 
     def enum_nodes_for_refresh(self):
         return map(lambda it: it[0].addr, filter(lambda it: it[1].rate <= 0, self._enum_nodes()))
 
+    def enum_questionable_nodes(self):
+        return map(lambda it: (it[0].id, it[0].addr), filter(lambda it: it[1].rate <= 0, self._enum_nodes()))
+
     @property
     def range_min(self):
         return self._range_min
@@ -53,15 +112,26 @@ class Bucket:
     def max_capacity(self):
         return self._max_capacity
 
+    @property
+    def last_changed(self):
+        return self._last_changed
+
+    @property
+    def can_split(self):
+        return self._range_max - self._range_min >= self._max_capacity
+
     @property
     def nodes(self):
         # Return only good nodes
         return map(lambda it: it[0], filter(lambda it: it[1].rate > 0, self._enum_nodes()))
 
+    def __len__(self):
+        return len(self._nodes)
+
     def __contains__(self, item):
         if isinstance(item, int):
-            return any(item == node.id for node in self._nodes)
+            return any(item == node.id for node, _ in self._enum_nodes())
         elif isinstance(item, tuple):
-            return any(item == (node.id, node.addr) for node in self._nodes)
+            return any(item == (node.id, node.addr) for node, _ in self._enum_nodes())
         else:
             raise TypeError("Unsupported type")
@@ -0,0 +1,96 @@
+from array import array
+from time import monotonic
+
+from .bucket import Bucket
+from .node import Node
+from .node_stat import NodeStat
+from ..utils import decode_nodes
+from ..utils import decode_nodes6
+from ..utils import encode_nodes
+from ..utils import encode_nodes6
+from ..utils import is_ipv6
+
+_RECORD_SIZE = 26  # Compact node info: 20 bytes of id, 4 bytes of IPv4 address and 2 bytes of port
+_RECORD6_SIZE = 38  # The same with 16 bytes of IPv6 address (BEP 32)
+
+
+class CompactBucket(Bucket):
+    # Struct-of-arrays storage: nodes are packed into one buffer in compact node info format, last
+    # response times are kept as monotonic floats and failure counters as bytes, so a contact costs
+    # ~35 bytes instead of a `Node`, a `NodeStat` and their attributes. IPv6 nodes are kept in arrays
+    # of their own, created on the first IPv6 node, so records of both families have fixed size.
+    __slots__ = ("_times", "_failures", "_nodes6", "_times6", "_failures6")
+
+    def __init__(self, range_min, range_max, max_capacity=8, last_changed=None):
+        super().__init__(range_min, range_max, max_capacity, last_changed)
+        self._nodes = bytearray()
+        self._times = array("d")
+        self._failures = bytearray()
+        self._nodes6 = None
+        self._times6 = None
+        self._failures6 = None
+
+    # region Storage
+    def _arrays(self, addr):
+        # Nodes buffer, times, failures, record size and encoder of the address family
+        if is_ipv6(addr[0]):
+            if self._nodes6 is None:
+                self._nodes6, self._times6, self._failures6 = bytearray(), array("d"), bytearray()
+
+            return self._nodes6, self._times6, self._failures6, _RECORD6_SIZE, encode_nodes6
+
+        return self._nodes, self._times, self._failures, _RECORD_SIZE, encode_nodes
+
+    def _find(self, node):
+        nodes, times, failures, size, encode = arrays = self._arrays(node.addr)
+        record = encode(((node.id, node.addr),))
+        for i in range(len(times)):
+            if nodes[i * size:(i + 1) * size] == record:
+                return arrays, i
+
+        return arrays, None
+
+    def _renew(self, node):
+        (_, times, failures, _, _), i = self._find(node)
+        if i is None:
+            return False
+
+        times[i] = monotonic()
+        failures[i] = 0
+        return True
+
+    def _fail(self, node):
+        (_, _, failures, _, _), i = self._find(node)
+        if i is None:
+            return None
+
+        failures[i] = min(failures[i] + 1, 255)
+        return failures[i]
+
+    def _insert(self, node, stat):
+        nodes, times, failures, _, encode = self._arrays(node.addr)
+        nodes += encode(((node.id, node.addr),))
+        times.append(stat.last_response)
+        failures.append(min(stat.failures, 255))
+
+    def _remove(self, node):
+        (nodes, times, failures, size, _), i = self._find(node)
+        if i is not None:
+            del nodes[i * size:(i + 1) * size]
+            del times[i]
+            del failures[i]
+
+    def _enum_nodes(self):
+        for decode, nodes, times, failures in (
+                (decode_nodes, self._nodes, self._times, self._failures),
+                (decode_nodes6, self._nodes6, self._times6, self._failures6)):
+            if nodes is None:
+                continue
+
+            for (id_, addr), last_response, failed in zip(decode(bytes(nodes)), times, failures):
+                yield Node(id_, addr), NodeStat(last_response, failed)
+
+    # endregion
+
+    def __len__(self):
+        return len(self._times) + (len(self._times6) if self._times6 is not None else 0)
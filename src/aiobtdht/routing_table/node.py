@@ -1,4 +1,6 @@
 class Node:
+    __slots__ = ("_id", "_addr")
+
     def __init__(self, id_, addr):
         self._id = id_
         self._addr = addr
@@ -10,3 +12,9 @@ class Node:
     @property
     def addr(self):
         return self._addr
+
+    def __eq__(self, other):
+        return isinstance(other, Node) and self._id == other._id and self._addr == other._addr
+
+    def __hash__(self):
+        return hash((self._id, self._addr))
@@ -1,26 +1,42 @@
-from datetime import datetime
+from time import monotonic
+
+
+def calc_rate(last_response, now=None):
+    now = monotonic() if now is None else now
+    delta = now - last_response
+
+    if delta < 15 * 60:
+        return delta / (30 * 60) + 1
+    elif delta > 30 * 60:
+        return -1
+    else:
+        return 0
 
 
 class NodeStat:
-    def __init__(self):
-        self._added = datetime.now()
-        self._last_response = self._added
+    __slots__ = ("_added", "_last_response", "_failures")
+
+    def __init__(self, last_response=None, failures=0):
+        self._added = monotonic()
+        self._last_response = self._added if last_response is None else last_response
+        self._failures = failures  # Consecutive requests without response
 
     def renew(self):
-        self._last_response = datetime.now()
+        self._last_response = monotonic()
+        self._failures = 0
+
+    def fail(self):
+        self._failures += 1
+        return self._failures
 
     @property
     def rate(self):
-        now = datetime.now()
-        delta = (now - self._last_response).seconds
-
-        if delta < 15 * 60:
-            return (now - self._last_response).seconds / (30 * 60) + 1
-        elif delta > 30 * 60:
-            return -1
-        else:
-            return 0
+        return calc_rate(self._last_response)
 
     @property
     def last_response(self):
         return self._last_response
+
+    @property
+    def failures(self):
+        return self._failures
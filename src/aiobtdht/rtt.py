@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+
+class RttStat:
+    # Smoothed round-trip time and its variance, like in TCP (RFC 6298), and consecutive timeouts
+    __slots__ = ("srtt", "rttvar", "failures")
+
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.failures = 0
+
+    def renew(self, rtt):
+        self.failures = 0
+
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def fail(self):
+        self.failures += 1
+
+    @property
+    def rto(self):
+        # Retransmission timeout, `None` until the first RTT sample
+        return None if self.srtt is None else self.srtt + 4 * self.rttvar
+
+
+class RttTracker:
+    # Round-trip times of recently queried addresses (least recently used ones are forgotten) and of all
+    # responses together as a fallback for unknown addresses. Request timeout is RTO of the address
+    # doubled for every consecutive timeout and bounded by `min_timeout` and `max_timeout`.
+    def __init__(self, min_timeout=0.5, max_timeout=3, max_size=65536):
+        self._min_timeout = min_timeout
+        self._max_timeout = max_timeout
+        self._max_size = max_size
+
+        self._stats = OrderedDict()  # addr -> RttStat
+        self._total = RttStat()
+
+    def _get(self, addr):
+        stat = self._stats.pop(addr, None)
+        if stat is None:
+            stat = RttStat()
+            if len(self._stats) >= self._max_size:
+                self._stats.popitem(last=False)
+
+        self._stats[addr] = stat
+        return stat
+
+    def renew(self, addr, rtt):
+        self._get(addr).renew(rtt)
+        self._total.renew(rtt)
+
+    def fail(self, addr):
+        self._get(addr).fail()
+
+    def timeout(self, addr):
+        stat = self._stats.get(addr)
+        rto = stat and stat.rto or self._total.rto
+        if rto is None:
+            return self._max_timeout
+
+        failures = stat.failures if stat else 0
+        return max(self._min_timeout, min(self._max_timeout, rto * 2 ** min(failures, 8)))
+
+    def srtt(self, addr):
+        # Smoothed RTT of the address, average one for unknown addresses
+        stat = self._stats.get(addr)
+        return stat.srtt if stat and stat.srtt is not None else self._total.srtt or self._max_timeout
+
+    def __len__(self):
+        return len(self._stats)
@@ -1,10 +1,14 @@
 from .utils import decode_id
 from .utils import decode_nodes
+from .utils import decode_nodes6
 from .utils import decode_peers
 from .utils import decode_samples
 from .utils import encode_id
 from .utils import encode_nodes
+from .utils import encode_nodes6
 from .utils import encode_peers
+from .utils import encode_samples
+from .validator import Schema
 
 _ID_ENCODE_SCHEMA = {"type": "binary", "minlength": 20, "maxlength": 20, "coerce": encode_id}
 _ID_DECODE_SCHEMA = {"type": "integer", "coerce": decode_id}
@@ -14,70 +18,99 @@ _INFO_HASH_DECODE_SCHEMA = _ID_DECODE_SCHEMA
 
 _NODES_ENCODE_SCHEMA = {"type": "binary", "coerce": encode_nodes}
 _NODES_DECODE_SCHEMA = {"type": "list", "coerce": decode_nodes}
+_NODES6_ENCODE_SCHEMA = {"type": "binary", "coerce": encode_nodes6}
+_NODES6_DECODE_SCHEMA = {"type": "list", "coerce": decode_nodes6}
+
+# BEP 32: list of requested address families of nodes, `n4` and/or `n6`
+_WANT_SCHEMA = {"type": "list", "required": False, "schema": {"type": "binary"}}
 
 _VALUES_ENCODE_SCHEMA = {"type": "list", "coerce": encode_peers, "schema": {"type": "binary"}}
 _VALUES_DECODE_SCHEMA = {"type": "list", "coerce": decode_peers}
 
 _TOKEN_SCHEMA = {"type": "binary"}
+_PORT_SCHEMA = {"type": "integer", "required": False, "min": 0, "max": 65535}
 
+_SAMPLES_ENCODE_SCHEMA = {"type": "binary", "coerce": encode_samples}
 _SAMPLES_DECODE_SCHEMA = {"type": "list", "coerce": decode_samples, "required": False}
 
-PING_ARGS = {"id": {"required": True, **_ID_DECODE_SCHEMA}}
-PING_RESULT = {"id": {"required": True, **_ID_ENCODE_SCHEMA}}
-PING_ARGS_REMOTE = {"id": {"required": True, **_ID_ENCODE_SCHEMA}}
-PING_RESULT_REMOTE = {"id": {"required": True, **_ID_DECODE_SCHEMA}}
+PING_ARGS = Schema({"id": {"required": True, **_ID_DECODE_SCHEMA}})
+PING_RESULT = Schema({"id": {"required": True, **_ID_ENCODE_SCHEMA}})
+PING_ARGS_REMOTE = Schema({"id": {"required": True, **_ID_ENCODE_SCHEMA}})
+PING_RESULT_REMOTE = Schema({"id": {"required": True, **_ID_DECODE_SCHEMA}})
 
-FIND_NODE_ARGS = {
+FIND_NODE_ARGS = Schema({
     "id": {"required": True, **_ID_DECODE_SCHEMA},
-    "target": {"required": True, **_ID_DECODE_SCHEMA}}
-FIND_NODE_RESULT = {
+    "target": {"required": True, **_ID_DECODE_SCHEMA},
+    "want": _WANT_SCHEMA})
+FIND_NODE_RESULT = Schema({
     "id": {"required": True, **_ID_ENCODE_SCHEMA},
-    "nodes": {"required": True, **_NODES_ENCODE_SCHEMA}}
-FIND_NODE_ARGS_REMOTE = {
+    "nodes": _NODES_ENCODE_SCHEMA,
+    "nodes6": _NODES6_ENCODE_SCHEMA})
+FIND_NODE_ARGS_REMOTE = Schema({
     "id": {"required": True, **_ID_ENCODE_SCHEMA},
-    "target": {"required": True, **_ID_ENCODE_SCHEMA}}
-FIND_NODE_RESULT_REMOTE = {
+    "target": {"required": True, **_ID_ENCODE_SCHEMA},
+    "want": _WANT_SCHEMA})
+FIND_NODE_RESULT_REMOTE = Schema({
     "id": {"required": True, **_ID_DECODE_SCHEMA},
-    "nodes": {"required": True, **_NODES_DECODE_SCHEMA}}
+    "nodes": _NODES_DECODE_SCHEMA,
+    "nodes6": _NODES6_DECODE_SCHEMA})
 
-GET_PEERS_ARGS = {
+GET_PEERS_ARGS = Schema({
     "id": {"required": True, **_ID_DECODE_SCHEMA},
-    "info_hash": {"required": True, **_INFO_HASH_DECODE_SCHEMA}}
-GET_PEERS_RESULT = {
+    "info_hash": {"required": True, **_INFO_HASH_DECODE_SCHEMA},
+    "want": _WANT_SCHEMA})
+GET_PEERS_RESULT = Schema({
     "id": {"required": True, **_ID_ENCODE_SCHEMA},
     "token": {"type": "binary", "required": True},
     "nodes": _NODES_ENCODE_SCHEMA,
+    "nodes6": _NODES6_ENCODE_SCHEMA,
     "values": _VALUES_ENCODE_SCHEMA
-}
-GET_PEERS_ARGS_REMOTE = {
+})
+GET_PEERS_ARGS_REMOTE = Schema({
     "id": {"required": True, **_ID_ENCODE_SCHEMA},
-    "info_hash": {"required": True, **_INFO_HASH_ENCODE_SCHEMA}}
-GET_PEERS_RESULT_REMOTE = {
+    "info_hash": {"required": True, **_INFO_HASH_ENCODE_SCHEMA},
+    "want": _WANT_SCHEMA})
+GET_PEERS_RESULT_REMOTE = Schema({
     "id": {"required": True, **_ID_DECODE_SCHEMA},
     "token": {"type": "binary", "required": True},
     "nodes": _NODES_DECODE_SCHEMA,
+    "nodes6": _NODES6_DECODE_SCHEMA,
     "values": _VALUES_DECODE_SCHEMA
-}
+})
 
-ANNOUNCE_PEER_ARGS = {
+ANNOUNCE_PEER_ARGS = Schema({
     "id": {"required": True, **_ID_DECODE_SCHEMA},
     "info_hash": {"required": True, **_INFO_HASH_DECODE_SCHEMA},
+    "port": _PORT_SCHEMA,
     "token": {"required": True, **_TOKEN_SCHEMA},
-    "implied_port": {"type": "integer", "required": False, "min": 0, "max": 1}}
-ANNOUNCE_PEER_RESULT = {"id": {"required": True, **_ID_ENCODE_SCHEMA}}
-ANNOUNCE_PEER_ARGS_REMOTE = {
+    "implied_port": {"type": "integer", "required": False, "min": 0, "max": 1}})
+ANNOUNCE_PEER_RESULT = Schema({"id": {"required": True, **_ID_ENCODE_SCHEMA}})
+ANNOUNCE_PEER_ARGS_REMOTE = Schema({
     "id": {"required": True, **_ID_ENCODE_SCHEMA},
     "info_hash": {"required": True, **_INFO_HASH_ENCODE_SCHEMA},
+    "port": _PORT_SCHEMA,
     "token": {"required": True, **_TOKEN_SCHEMA},
-    "implied_port": {"type": "integer", "required": False, "min": 0, "max": 1}}
-ANNOUNCE_PEER_RESULT_REMOTE = {"id": {"required": True, **_ID_DECODE_SCHEMA}}
+    "implied_port": {"type": "integer", "required": False, "min": 0, "max": 1}})
+ANNOUNCE_PEER_RESULT_REMOTE = Schema({"id": {"required": True, **_ID_DECODE_SCHEMA}})
 
-SAMPLE_INFOHASHES_ARGS_REMOTE = {
+SAMPLE_INFOHASHES_ARGS = Schema({
+    "id": {"required": True, **_ID_DECODE_SCHEMA},
+    "target": {"required": True, **_ID_DECODE_SCHEMA},
+    "want": _WANT_SCHEMA})
+SAMPLE_INFOHASHES_RESULT = Schema({
+    "id": {"required": True, **_ID_ENCODE_SCHEMA},
+    "interval": {"type": "integer", "required": True, "min": 0},
+    "nodes": _NODES_ENCODE_SCHEMA,
+    "nodes6": _NODES6_ENCODE_SCHEMA,
+    "num": {"type": "integer", "required": True, "min": 0},
+    "samples": {"required": True, **_SAMPLES_ENCODE_SCHEMA}})
+SAMPLE_INFOHASHES_ARGS_REMOTE = Schema({
     "id": {"required": True, **_ID_ENCODE_SCHEMA},
-    "target": {"required": True, **_ID_ENCODE_SCHEMA}}
-SAMPLE_INFOHASHES_RESULT_REMOTE = {
+    "target": {"required": True, **_ID_ENCODE_SCHEMA}})
+SAMPLE_INFOHASHES_RESULT_REMOTE = Schema({
     "id": {"required": True, **_ID_DECODE_SCHEMA},
     "interval": {"type": "integer", "required": False},
     "nodes": _NODES_DECODE_SCHEMA,
+    "nodes6": _NODES6_DECODE_SCHEMA,
     "num": {"type": "integer", "required": False},
-    "samples": _SAMPLES_DECODE_SCHEMA}
+    "samples": _SAMPLES_DECODE_SCHEMA})
@@ -0,0 +1,97 @@
+from functools import lru_cache
+from ipaddress import ip_address
+
+from .utils import pack_host
+
+# BEP 42 masks of the first 4 (IPv4) or 8 (IPv6) bytes of the address
+_MASK_V4 = 0x030F3FFF
+_MASK_V6 = 0x0103070F1F3F7FFF
+
+MODES = ("off", "prefer", "enforce")
+
+
+def _crc32c_table():
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+
+        table.append(crc)
+
+    return table
+
+
+_CRC32C_TABLE = _crc32c_table()
+
+
+def crc32c(data):
+    crc = 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+
+    return crc ^ 0xFFFFFFFF
+
+
+@lru_cache(maxsize=65536)
+def is_local(host):
+    # Loopback, private (including IPv6 unique local fc00::/7) and link-local addresses are exempt from checks
+    ip = ip_address(host)
+    return ip.is_private or ip.is_loopback or ip.is_link_local
+
+
+def subnet(host):
+    # /24 of IPv4 or /64 of IPv6 address, `None` for local addresses
+    if is_local(host):
+        return None
+
+    packed = pack_host(host)
+    return packed[:3] if len(packed) == 4 else packed[:8]
+
+
+def id_prefixes(host):
+    # Expected 21-bit prefixes of node id for every value of its 3 last bits
+    packed = pack_host(host)
+    if len(packed) == 4:
+        ip, size, shift = int.from_bytes(packed, "big") & _MASK_V4, 4, 29
+    else:
+        ip, size, shift = int.from_bytes(packed[:8], "big") & _MASK_V6, 8, 61
+
+    return tuple(crc32c((ip | r << shift).to_bytes(size, "big")) >> 11 for r in range(8))
+
+
+def secure_id(host, rand):
+    # Node id compliant with BEP 42 for external address `host`, `rand` -- random 160-bit integer
+    r = rand & 7
+    return id_prefixes(host)[r] << 139 | rand & ((1 << 139) - 1) & ~7 | r
+
+
+class NodeIdVerifier:
+    # BEP 42 node id check: the first 21 bits of the id must match CRC32C of the masked IP of the node combined
+    # with the last 3 bits of the id. Local addresses are exempt. `enforce` mode rejects nodes with wrong ids,
+    # `prefer` one ranks them after valid nodes, `off` disables checks. Expected prefixes are cached per IP.
+    def __init__(self, mode="prefer", max_cache_size=65536):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}', expected one of {MODES}")
+
+        self.mode = mode
+        self._max_cache_size = max_cache_size
+        self._cache = {}  # host -> prefixes or `None` for local addresses
+
+    def is_valid(self, id_, addr):
+        host = addr[0]
+        try:
+            prefixes = self._cache[host]
+        except KeyError:
+            prefixes = None if is_local(host) else id_prefixes(host)
+            if len(self._cache) < self._max_cache_size:
+                self._cache[host] = prefixes
+
+        return prefixes is None or prefixes[id_ & 7] == id_ >> 139
+
+    def accept(self, id_, addr):
+        return self.mode != "enforce" or self.is_valid(id_, addr)
+
+    def rank(self, id_, addr):
+        # 0 for preferred nodes, 1 for the rest
+        return 0 if self.mode != "prefer" or self.is_valid(id_, addr) else 1
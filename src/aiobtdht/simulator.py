@@ -0,0 +1,100 @@
+import asyncio
+from ipaddress import IPv6Address
+from random import Random
+
+
+class Network:
+    # In-process datagram network for simulations: every endpoint gets a one-way latency drawn from
+    # `latency` range, datagram delay is the mean of sender and receiver latencies, `loss` is the
+    # probability of a datagram being dropped. Datagrams to unknown addresses are dropped as well.
+    def __init__(self, latency=(0.005, 0.05), loss=0.0, seed=None):
+        self._latency = latency
+        self._loss = loss
+        self._random = Random(seed)
+
+        self._endpoints = {}  # addr -> Endpoint
+        self._delays = {}  # addr -> one-way latency
+
+        self._sent = 0
+        self._lost = 0
+
+    def register(self, addr, endpoint):
+        if addr in self._endpoints:
+            raise ValueError(f"Address {addr} is already in use")
+
+        self._endpoints[addr] = endpoint
+        self._delays[addr] = self._random.uniform(*self._latency)
+
+    def unregister(self, addr):
+        self._endpoints.pop(addr, None)
+        self._delays.pop(addr, None)
+
+    def addr(self, index, port=6881):
+        # Unique address of `index`-th simulated host
+        return f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}", port
+
+    def addr6(self, index, port=6881):
+        # Unique IPv6 (unique local) address of `index`-th simulated host
+        return str(IPv6Address(0xFD00 << 112 | index)), port
+
+    def send(self, data, src, dst):
+        self._sent += 1
+
+        endpoint = self._endpoints.get(dst)
+        if endpoint is None or (self._loss and self._random.random() < self._loss):
+            self._lost += 1
+            return
+
+        delay = (self._delays[src] + self._delays[dst]) / 2
+        endpoint.loop.call_later(delay, endpoint.deliver, data, src)
+
+    @property
+    def sent(self):
+        return self._sent
+
+    @property
+    def lost(self):
+        return self._lost
+
+    def __len__(self):
+        return len(self._endpoints)
+
+
+class Endpoint:
+    # Stands in for `aioudp.UDPServer`: same `run`/`subscribe`/`unsubscribe`/`send` interface,
+    # datagrams go through `network` instead of a socket. Dual-stack endpoint (`host6` is set) sends
+    # from the address of the destination family, like `DualStackServer`.
+    def __init__(self, network):
+        self._network = network
+        self._subscribers = {}
+
+        self.addr = None
+        self.addr6 = None
+        self.loop = None
+
+    def run(self, host, port, loop=None, host6=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.addr = (host, port)
+        self._network.register(self.addr, self)
+
+        if host6:
+            self.addr6 = (host6, port)
+            self._network.register(self.addr6, self)
+
+    def close(self):
+        self._network.unregister(self.addr)
+        if self.addr6:
+            self._network.unregister(self.addr6)
+
+    def subscribe(self, fut):
+        self._subscribers[id(fut)] = fut
+
+    def unsubscribe(self, fut):
+        self._subscribers.pop(id(fut), None)
+
+    def send(self, data, addr):
+        self._network.send(data, self.addr6 if self.addr6 and ":" in addr[0] else self.addr, addr)
+
+    def deliver(self, data, addr):
+        for fut in self._subscribers.values():
+            asyncio.ensure_future(fut(data, addr))
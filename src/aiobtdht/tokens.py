@@ -0,0 +1,42 @@
+from hashlib import blake2b
+
+from .utils import pack_host
+from .utils import random
+
+
+class TokenManager:
+    # Tokens are keyed BLAKE2b digests of the packed requester IP. Only the current and the previous
+    # secrets are accepted (BEP 5), tokens computed for the current secret are cached until rotation.
+    def __init__(self, token_size=8, max_cache_size=65536):
+        self._token_size = token_size
+        self._max_cache_size = max_cache_size
+        self._secrets = (random(32),)
+        self._cache = {}
+        self._prev_cache = {}
+
+    def _calc(self, host, secret):
+        return blake2b(pack_host(host), digest_size=self._token_size, key=secret).digest()
+
+    def _cached(self, host, secret, cache):
+        token = cache.get(host)
+        if token is None:
+            token = self._calc(host, secret)
+            if len(cache) < self._max_cache_size:
+                cache[host] = token
+
+        return token
+
+    def rotate(self):
+        self._secrets = (random(32), self._secrets[0])
+        self._prev_cache, self._cache = self._cache, {}
+
+    def get(self, addr):
+        return self._cached(addr[0], self._secrets[0], self._cache)
+
+    def check(self, addr, token):
+        if token == self.get(addr):
+            return True
+        elif len(self._secrets) > 1:
+            return token == self._cached(addr[0], self._secrets[1], self._prev_cache)
+        else:
+            return False
@@ -0,0 +1,207 @@
+import asyncio
+from collections import deque
+
+from .utils import RateLimiter
+
+
+class TransactionTable:
+    # Outbound KRPC transactions. Deadlines are kept in a timer wheel of `resolution` seconds slots driven by
+    # a single timer handle, so a request costs one future instead of a `wait_for` task and timer. At most
+    # `window` requests are in flight per destination, the rest wait for a free slot. Datagrams are sent at
+    # most `rate` per second with bursts up to `burst`, so responses of a big fan-out fit into the socket
+    # receive buffer; zero rate is unlimited. Deadline of a request starts when its datagram is sent,
+    # datagrams of requests finished while queued are dropped. Future result is `(addr, response, sent)`,
+    # where `sent` is loop time the datagram was sent at, or `None` on timeout.
+    def __init__(self, send, loop=None, resolution=0.05, window=16, rate=5000, burst=512):
+        self._send = send  # Function `send(data, addr)`
+        self._loop = loop
+        self._resolution = resolution
+        self._window = window
+        self._rate = rate
+        self._limiter = RateLimiter(rate, burst)
+
+        self._tr_seq = 0
+        self._pending = {}  # (addr, t) -> (future, slot, sent), slot and sent are `None` until the datagram is sent
+        self._wheel = {}  # slot -> {(addr, t), ...}
+        self._timer = None
+        self._in_flight = {}  # addr -> number of pending transactions
+        self._waiting = {}  # addr -> deque of (future, make_message, timeout) waiting for a window slot
+        self._send_queue = deque()  # (future, key, data, timeout) waiting for the rate limiter
+        self._queued = 0  # Number of unfinished transactions in the send queue
+        self._send_timer = None
+
+        self._sent = 0
+        self._timeouts = 0
+
+    # region Internal methods
+    def _get_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.get_event_loop()
+
+        return self._loop
+
+    def _slot(self, timestamp):
+        return int(timestamp // self._resolution) + 1
+
+    def _fetch_tr(self, addr):
+        while True:
+            self._tr_seq = (self._tr_seq + 1) % 0x10000
+            t = self._tr_seq.to_bytes(2, "big")
+            if (addr, t) not in self._pending:
+                return t
+
+    def _start(self, addr, fut, make_message, timeout):
+        t = self._fetch_tr(addr)
+        key = (addr, t)
+
+        self._pending[key] = (fut, None, None)
+        self._in_flight[addr] = self._in_flight.get(addr, 0) + 1
+        fut.add_done_callback(lambda _: self._finish(key))
+
+        self._transmit(fut, key, make_message(t), timeout)
+
+    def _finish(self, key):
+        _, slot, _ = self._pending.pop(key)
+        if slot is None:
+            self._queued -= 1
+        else:
+            keys = self._wheel.get(slot)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    self._wheel.pop(slot)
+
+        addr = key[0]
+        if self._in_flight[addr] > 1:
+            self._in_flight[addr] -= 1
+        else:
+            self._in_flight.pop(addr)
+
+        # Start the next request waiting for this destination, skipping cancelled ones
+        waiting = self._waiting.get(addr)
+        while waiting:
+            fut, make_message, timeout = waiting.popleft()
+            if not fut.done():
+                self._start(addr, fut, make_message, timeout)
+                break
+
+        if waiting is not None and not waiting:
+            self._waiting.pop(addr)
+
+    def _tick(self):
+        self._timer = None
+        slot = self._slot(self._get_loop().time()) - 1
+
+        for expired in [it for it in self._wheel if it <= slot]:
+            for key in self._wheel.pop(expired):
+                fut = self._pending[key][0]
+                if not fut.done():
+                    self._timeouts += 1
+                    fut.set_result(None)
+
+        if self._wheel:
+            self._timer = self._loop.call_later(self._resolution, self._tick)
+
+    def _transmit(self, fut, key, data, timeout):
+        if not self._queued and self._limiter.try_acquire():
+            self._send_datagram(fut, key, data, timeout)
+        else:
+            self._queued += 1
+            self._send_queue.append((fut, key, data, timeout))
+            if self._send_timer is None:
+                self._send_timer = self._get_loop().call_later(1 / self._rate, self._drain)
+
+    def _send_datagram(self, fut, key, data, timeout):
+        # Deadline is counted from the moment the datagram is handed to the transport
+        loop = self._get_loop()
+        sent = loop.time()
+        slot = self._slot(sent + timeout)
+
+        self._pending[key] = (fut, slot, sent)
+        self._wheel.setdefault(slot, set()).add(key)
+        if self._timer is None:
+            self._timer = loop.call_later(self._resolution, self._tick)
+
+        self._sent += 1
+        self._send(data, key[0])
+
+    def _drain(self):
+        self._send_timer = None
+        while self._send_queue:
+            # Datagrams of transactions finished while queued (cancelled callers) are dropped
+            if self._send_queue[0][0].done():
+                self._send_queue.popleft()
+                continue
+
+            if not self._limiter.try_acquire():
+                break
+
+            self._queued -= 1
+            self._send_datagram(*self._send_queue.popleft())
+
+        if self._send_queue:
+            self._send_timer = self._loop.call_later(1 / self._rate, self._drain)
+
+    # endregion
+
+    def request(self, addr, make_message, timeout):
+        # Make_message -- function `make_message(t)`, result is datagram of query with transaction id `t`
+        fut = self._get_loop().create_future()
+
+        if self._in_flight.get(addr, 0) < self._window:
+            self._start(addr, fut, make_message, timeout)
+        else:
+            self._waiting.setdefault(addr, deque()).append((fut, make_message, timeout))
+
+        return fut
+
+    def resolve(self, addr, t, response=None, error=None):
+        # Complete transaction with response or exception `error`, result is `False` for unknown transactions
+        pending = self._pending.get((addr, t))
+        if pending is None or pending[0].done():
+            return False
+
+        if error is None:
+            pending[0].set_result((addr, response, pending[2]))
+        else:
+            pending[0].set_exception(error)
+
+        return True
+
+    def close(self):
+        # Cancel every pending and waiting request and unsent datagrams
+        for fut, _, _ in list(self._pending.values()):
+            fut.cancel()
+
+        for waiting in self._waiting.values():
+            for fut, _, _ in waiting:
+                fut.cancel()
+
+        self._waiting.clear()
+        self._send_queue.clear()
+
+        for timer in (self._timer, self._send_timer):
+            if timer is not None:
+                timer.cancel()
+
+        self._timer = self._send_timer = None
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    @property
+    def waiting(self):
+        return sum(len(it) for it in self._waiting.values())
+
+    @property
+    def send_queue_depth(self):
+        return self._queued
+
+    @property
+    def sent(self):
+        return self._sent
+
+    @property
+    def timeouts(self):
+        return self._timeouts
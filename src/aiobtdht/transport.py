@@ -0,0 +1,45 @@
+import socket
+
+from aioudp import UDPServer
+
+from .utils import is_ipv6
+
+
+class UDP6Server(UDPServer):
+    # `UDPServer` on IPv6 socket, accepts IPv6 datagrams only
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+        self._sock.close()
+        self._sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM, 0)
+        self._sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_V6ONLY, 1)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.setblocking(False)
+
+    def _datagram_received(self, data, addr):
+        # IPv6 socket address is (host, port, flowinfo, scope_id)
+        return data, addr[:2]
+
+
+class DualStackServer:
+    # IPv4 and IPv6 sockets behind `UDPServer` interface, datagrams are sent through the socket of
+    # the destination address family (BEP 32). `kwargs` are `UDPServer` arguments.
+    def __init__(self, **kwargs):
+        self._server = UDPServer(**kwargs)
+        self._server6 = UDP6Server(**kwargs)
+
+    def run(self, host="0.0.0.0", port=6881, loop=None, host6="::"):
+        self.loop = loop
+        self._server.run(host, port, loop)
+        self._server6.run(host6, port, loop)
+
+    def subscribe(self, fut):
+        self._server.subscribe(fut)
+        self._server6.subscribe(fut)
+
+    def unsubscribe(self, fut):
+        self._server.unsubscribe(fut)
+        self._server6.unsubscribe(fut)
+
+    def send(self, data, addr):
+        (self._server6 if is_ipv6(addr[0]) else self._server).send(data, addr)
@@ -1,7 +1,21 @@
 import asyncio
+import os
 from hashlib import sha1
 from os import urandom
+from socket import AF_INET6
 from socket import inet_aton, inet_ntoa
+from socket import inet_ntop
+from socket import inet_pton
+from struct import Struct
+from struct import error as StructError
+from time import monotonic
+
+# Compact formats: 20 bytes of node id, 4 bytes of IPv4 (16 bytes of IPv6) address and 2 bytes of port
+_ID = Struct("!20s")
+_ADDR = Struct("!4sH")
+_NODE = Struct("!20s4sH")
+_ADDR6 = Struct("!16sH")
+_NODE6 = Struct("!20s16sH")
 
 
 def random(size=1):
@@ -28,46 +42,146 @@ def decode_info_hash(info_hash):
 
 
 def decode_samples(samples):
-    return [decode_id(samples[i:i+20]) for i in range(0, len(samples), 20)]
+    if len(samples) % 20 != 0:
+        raise ValueError("Wrong length")
+
+    from_bytes = int.from_bytes
+    return [from_bytes(id_, "big") for id_, in _ID.iter_unpack(samples)]
+
+
+def encode_samples(samples):
+    pack = _ID.pack
+    return b"".join([pack(id_.to_bytes(20, "big")) for id_ in samples])
+
+
+def is_ipv6(host):
+    return ":" in host
+
+
+def pack_host(host):
+    return inet_pton(AF_INET6, host) if ":" in host else inet_aton(host)
 
 
 def encode_addr(addr):
     host, port = addr
-    return b"".join((inet_aton(host), port.to_bytes(2, "big")))
+    if ":" in host:
+        return _ADDR6.pack(inet_pton(AF_INET6, host), port)
+
+    return _ADDR.pack(inet_aton(host), port)
 
 
 def decode_addr(addr):
+    if len(addr) == 6:
+        host, port = _ADDR.unpack(addr)
+        return (inet_ntoa(host), port)
+
+    if len(addr) == 18:
+        host, port = _ADDR6.unpack(addr)
+        return (inet_ntop(AF_INET6, host), port)
+
     host, port = addr[:4], addr[4:6]
     return (inet_ntoa(host), int.from_bytes(port, "big"))
 
 
 def encode_nodes(nodes):
-    return b"".join(b"".join((encode_id(id_), encode_addr(addr))) for id_, addr in nodes)
+    pack = _NODE.pack
+    return b"".join([pack(id_.to_bytes(20, "big"), inet_aton(host), port) for id_, (host, port) in nodes])
 
 
 def decode_nodes(nodes):
     if len(nodes) % 26 != 0:
         raise ValueError("Wrong length")
 
-    return [(decode_id(nodes[i: i + 20]), decode_addr(nodes[i + 20: i + 26])) for i in range(0, len(nodes), 26)]
+    from_bytes = int.from_bytes
+    return [(from_bytes(id_, "big"), (inet_ntoa(host), port)) for id_, host, port in _NODE.iter_unpack(nodes)]
+
+
+def encode_nodes6(nodes):
+    pack = _NODE6.pack
+    return b"".join([
+        pack(id_.to_bytes(20, "big"), inet_pton(AF_INET6, host), port) for id_, (host, port) in nodes
+    ])
+
+
+def decode_nodes6(nodes):
+    if len(nodes) % 38 != 0:
+        raise ValueError("Wrong length")
+
+    from_bytes = int.from_bytes
+    return [
+        (from_bytes(id_, "big"), (inet_ntop(AF_INET6, host), port)) for id_, host, port in _NODE6.iter_unpack(nodes)
+    ]
 
 
 def encode_peers(peers):
-    return [encode_addr(peer) for peer in peers]
+    pack = _ADDR.pack
+    try:
+        return [pack(inet_aton(host), port) for host, port in peers]
+    except OSError:  # IPv6 peers
+        return [encode_addr(peer) for peer in peers]
 
 
 def decode_peers(peers):
-    return [decode_addr(peer) for peer in peers]
+    try:
+        return [(inet_ntoa(host), port) for host, port in map(_ADDR.unpack, peers)]
+    except StructError:  # Values of unexpected length
+        return [decode_addr(peer) for peer in peers]
+
+
+def write_file_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
 
 
 async def run_every(f, delay):
+    # Delay is counted from the start of previous call
     while True:
+        started = monotonic()
         r = f()
 
         if asyncio.iscoroutine(r):
             await r
 
-        await asyncio.sleep(delay)
+        await asyncio.sleep(max(0, delay - (monotonic() - started)))
+
+
+async def merge(*iterators):
+    # Items of async iterators in order of arrival, iterators are closed when the result is closed
+    if len(iterators) == 1:
+        try:
+            async for item in iterators[0]:
+                yield item
+        finally:
+            await iterators[0].aclose()
+
+        return
+
+    pending = {asyncio.ensure_future(it.__anext__()): it for it in iterators}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                it = pending.pop(fut)
+                try:
+                    item = fut.result()
+                except StopAsyncIteration:
+                    continue
+
+                pending[asyncio.ensure_future(it.__anext__())] = it
+                yield item
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+        for it in iterators:
+            await it.aclose()
 
 
 async def call_timeout(f, timeout, default):
@@ -75,3 +189,32 @@ async def call_timeout(f, timeout, default):
         return await asyncio.wait_for(f, timeout)
     except asyncio.TimeoutError:
         return default
+
+
+class RateLimiter:
+    # Token bucket: `rate` tokens per second with bursts up to `burst` tokens, zero rate is unlimited
+    def __init__(self, rate, burst=None):
+        self._rate = rate
+        self._burst = burst or max(rate, 1)
+        self._tokens = self._burst
+        self._updated = monotonic()
+
+    def _refill(self):
+        now = monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        if not self._rate:
+            return True
+
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+
+        return False
+
+    async def acquire(self, tokens=1):
+        while not self.try_acquire(tokens):
+            await asyncio.sleep((tokens - self._tokens) / self._rate)
@@ -0,0 +1,126 @@
+from collections.abc import Mapping
+from collections.abc import Sequence
+
+_TYPES = {
+    "binary": lambda value: isinstance(value, (bytes, bytearray)),
+    "integer": lambda value: isinstance(value, int),
+    "list": lambda value: isinstance(value, Sequence) and not isinstance(value, str),
+    "string": lambda value: isinstance(value, str),
+    "dict": lambda value: isinstance(value, Mapping)
+}
+
+
+def _compile_rules(rules):
+    # Build a function `check(value) -> (value, error)` for Cerberus rules of a single field.
+    # Coercion goes first, then type check, then the rest of constraints like Cerberus does.
+    coerce = rules.get("coerce")
+    type_name = rules.get("type")
+    type_check = _TYPES[type_name] if type_name else None
+    constraints = []
+
+    if "allowed" in rules:
+        allowed = rules["allowed"]
+        constraints.append(lambda value: None if value in allowed else f"unallowed value {value}")
+
+    if "minlength" in rules:
+        minlength = rules["minlength"]
+        constraints.append(lambda value: None if len(value) >= minlength else f"min length is {minlength}")
+
+    if "maxlength" in rules:
+        maxlength = rules["maxlength"]
+        constraints.append(lambda value: None if len(value) <= maxlength else f"max length is {maxlength}")
+
+    if "min" in rules:
+        min_value = rules["min"]
+        constraints.append(lambda value: None if value >= min_value else f"min value is {min_value}")
+
+    if "max" in rules:
+        max_value = rules["max"]
+        constraints.append(lambda value: None if value <= max_value else f"max value is {max_value}")
+
+    item_check = _compile_rules(rules["schema"]) if "schema" in rules else None
+    item_checks = tuple(_compile_rules(item) for item in rules["items"]) if "items" in rules else None
+
+    def check(value):
+        if coerce is not None:
+            try:
+                value = coerce(value)
+            except Exception as e:
+                return value, f"cannot be coerced: {e}"
+
+        if value is None:
+            return value, "null value not allowed"
+
+        if type_check is not None and not type_check(value):
+            return value, f"must be of {type_name} type"
+
+        if item_check is not None:
+            value, error = _check_items(value, (item_check,) * len(value))
+            if error:
+                return value, error
+
+        if item_checks is not None:
+            if len(value) != len(item_checks):
+                return value, f"length of list should be {len(item_checks)}, it is {len(value)}"
+
+            value, error = _check_items(value, item_checks)
+            if error:
+                return value, error
+
+        for constraint in constraints:
+            error = constraint(value)
+            if error:
+                return value, error
+
+        return value, None
+
+    return check
+
+
+def _check_items(value, checks):
+    items = []
+
+    for item, check in zip(value, checks):
+        item, error = check(item)
+        if error:
+            return value, f"item {len(items)} {error}"
+
+        items.append(item)
+
+    return items, None
+
+
+class Schema(dict):
+    # Cerberus schema compiled into per-field check functions on creation. Schema is still a `dict`,
+    # so it's accepted by `KRPCServer.register_callback` and by Cerberus validator as well.
+    def __init__(self, schema):
+        super().__init__(schema)
+        self._fields = tuple(
+            (name, rules.get("required", False), _compile_rules(rules))
+            for name, rules in schema.items()
+        )
+
+    def validate(self, document, allow_unknown=True):
+        # Result -- tuple (normalized document, None) when valid, (None, errors) otherwise
+        if not isinstance(document, Mapping):
+            raise TypeError(f"'{document}' is not a document, must be a dict")
+
+        result = dict(document)
+        errors = {}
+
+        for name, required, check in self._fields:
+            if name in result:
+                value, error = check(result[name])
+                if error:
+                    errors[name] = [error]
+                else:
+                    result[name] = value
+            elif required:
+                errors[name] = ["required field"]
+
+        if not allow_unknown:
+            for name in result:
+                if name not in self:
+                    errors[name] = ["unknown field"]
+
+        return (None, errors) if errors else (result, None)
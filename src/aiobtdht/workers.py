@@ -0,0 +1,83 @@
+import asyncio
+import multiprocessing
+import os
+
+from .multi import MultiDHT
+
+# Workers listen on consecutive ports instead of sharing one port with `SO_REUSEPORT`. The kernel spreads
+# datagrams of a shared port between sockets by hash of the remote address, so a response to a query of one
+# worker may be delivered to another one, which doesn't know the transaction. With a port per worker every
+# worker is a separate node (or set of nodes) for the network.
+
+
+def _run_worker(host, port, local_ids, initial_peers, kwargs):
+    from aioudp import UDPServer
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    udp = UDPServer()
+    udp.run(host, port, loop=loop)
+
+    dht = MultiDHT(local_ids, server=udp, loop=loop, **kwargs)
+    loop.call_soon(dht.start)
+    if initial_peers:
+        loop.run_until_complete(dht.bootstrap(initial_peers))
+
+    loop.run_forever()
+
+
+class WorkerPool:
+    # Runs `MultiDHT` nodes in `workers` processes, worker `i` listens on `port + i`. Ids are sorted and split
+    # into contiguous ranges, so every worker owns a part of the id space; each worker has its own routing
+    # table and peer store.
+    def __init__(self, local_ids, host="0.0.0.0", port=6881, workers=None, initial_peers=(), **kwargs):
+        ids = sorted(set(local_ids))
+        workers = min(workers or os.cpu_count() or 1, len(ids))
+        if not workers:
+            raise ValueError("At least one id is required")
+
+        self._host = host
+        self._port = port
+        self._initial_peers = list(initial_peers)
+        self._kwargs = kwargs
+        self._shards = [ids[len(ids) * i // workers:len(ids) * (i + 1) // workers] for i in range(workers)]
+        self._processes = []
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")
+
+        for i, shard in enumerate(self._shards):
+            kwargs = dict(self._kwargs)
+            if kwargs.get("snapshot_path"):
+                kwargs["snapshot_path"] = f"{kwargs['snapshot_path']}.{i}"
+
+            process = context.Process(
+                target=_run_worker,
+                args=(self._host, self._port + i, shard, self._initial_peers, kwargs),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+    def stop(self, timeout=5):
+        for process in self._processes:
+            process.terminate()
+
+        for process in self._processes:
+            process.join(timeout)
+
+        self._processes.clear()
+
+    @property
+    def addrs(self):
+        # Listen address of every worker
+        return [(self._host, self._port + i) for i in range(len(self._shards))]
+
+    @property
+    def shards(self):
+        # Ids of every worker
+        return [list(shard) for shard in self._shards]
+
+    def __len__(self):
+        return len(self._shards)